@@ -0,0 +1,412 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measures what loading each environment of this configuration costs at
+startup: YAML load time, include and '@' reference resolution time, number of
+engines, apps, frameworks and settings, and peak memory. The environments
+are the ones core/hooks/pick_environment.py picks from a context (project,
+shot, asset, sequence, shot_step and asset_step) and the shotgun_*
+environments of the Shotgun menus.
+
+Each environment is loaded in its own process so peak memory isn't carried
+over, and the includes and app blocks costing the most are listed.
+
+The environment files are resolved here the way Toolkit resolves them, to
+time each step: the files listed under the includes are loaded recursively,
+relative to the including file, and every '@name' string value is replaced
+with the value of name from the files it includes. Includes built from
+template keys, like the per Shot sgtk_overrides.yml files, depend on the
+context and are left out. Toolkit itself skips the YAML parsing at startup
+once its cache is baked with 'tank cache_yaml'.
+
+Usage:
+
+    python environment_benchmark.py [--environments shot_step,asset_step] \\
+        [--repeat 5] [--loader pure|c] [--top 5] [--output results.json] \\
+        [--core <tk-core>/python]
+
+Toolkit ships a pure python YAML parser, which --loader pure (the default)
+matches. With --core, the pick_environment hook is also run against a
+context of each kind, to check which environment it picks.
+"""
+
+import copy
+import cPickle
+import imp
+import json
+import optparse
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import yaml
+
+from turnover_fixtures import CONFIG_ROOT
+
+ENV_ROOT = os.path.join(CONFIG_ROOT, "env")
+
+# Use the libyaml parser when PyYAML was built with it, see --loader.
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Environment picked by core/hooks/pick_environment.py -> the context it is
+# picked for, as (entity type, has step).
+PICKED_ENVIRONMENTS = [
+    ("project", (None, False)),
+    ("shot", ("Shot", False)),
+    ("asset", ("Asset", False)),
+    ("sequence", ("Sequence", False)),
+    ("shot_step", ("Shot", True)),
+    ("asset_step", ("Asset", True)),
+]
+
+
+class ResolveError(Exception):
+    """
+    Raised when an environment can't be resolved.
+    """
+
+
+def environment_names(env_root=ENV_ROOT):
+    """
+    List the environments of the configuration.
+
+    :param env_root: Folder holding the environment files
+    :returns list: Environment names, ie. file names without .yml
+    """
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(env_root) if f.endswith(".yml"))
+
+
+def load_yaml(path):
+    """
+    Parse a YAML file.
+
+    :param path: Path to the file
+    :returns: The parsed data, an empty dictionary for an empty file
+    """
+    with open(path) as yaml_file:
+        return yaml.load(yaml_file, Loader=_Loader) or {}
+
+
+def _include_path(include, including_path):
+    path = os.path.expanduser(os.path.expandvars(include))
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(including_path), path)
+    return os.path.normpath(path)
+
+
+def _resolve_refs(lookup, data, path):
+    if isinstance(data, dict):
+        return dict((key, _resolve_refs(lookup, value, path)) for (key, value) in data.iteritems())
+    if isinstance(data, list):
+        return [_resolve_refs(lookup, value, path) for value in data]
+    if isinstance(data, basestring) and data.startswith("@"):
+        name = data[1:]
+        if name not in lookup:
+            raise ResolveError("Undefined reference '%s' in %s" % (data, path))
+        return copy.deepcopy(lookup[name])
+    return data
+
+
+class _Resolver(object):
+    # Resolves files once each, recording the time spent on them.
+
+    def __init__(self, timings=None):
+        self.files = []
+        self.context_includes = []
+        self.timings = timings
+        self._resolved = {}
+
+    def resolve(self, path):
+        """
+        :returns: (data, frameworks) tuple, the resolved content of the file
+                  and the frameworks of its includes
+        """
+        path = os.path.normpath(os.path.abspath(path))
+        if path in self._resolved:
+            return self._resolved[path]
+        if not os.path.isfile(path):
+            raise ResolveError("Include file %s does not exist" % path)
+        if path not in self.files:
+            self.files.append(path)
+
+        start_time = time.time()
+        data = load_yaml(path)
+        load_time = time.time() - start_time
+
+        # Like Toolkit, only the names defined by the files a file includes
+        # directly can be referenced from it, later includes overriding
+        # earlier ones, while frameworks are merged from all the includes.
+        lookup = {}
+        frameworks = {}
+        for include in data.pop("includes", None) or []:
+            if "{" in include:
+                # Includes made of template keys, ie. per Shot overrides,
+                # depend on the context and are left out.
+                if include not in self.context_includes:
+                    self.context_includes.append(include)
+                continue
+            (included, included_frameworks) = self.resolve(_include_path(include, path))
+            included = dict(included)
+            frameworks.update(included_frameworks)
+            if isinstance(included.get("frameworks"), dict):
+                frameworks.update(included.pop("frameworks"))
+            lookup.update(included)
+
+        start_time = time.time()
+        data = _resolve_refs(lookup, data, path)
+        frameworks = _resolve_refs(lookup, frameworks, path)
+        if self.timings is not None:
+            self.timings[path] = {"load": load_time, "resolve": time.time() - start_time}
+        self._resolved[path] = (data, frameworks)
+        return self._resolved[path]
+
+
+def resolve_environment(path, timings=None):
+    """
+    Resolve an environment file.
+
+    :param path: Path to the environment file
+    :param timings: Optional dictionary filled with the YAML load and
+                    reference resolution times of each file, in seconds
+    :returns: (environment data, list of the paths of the files it was built
+              from) tuple
+    """
+    resolver = _Resolver(timings)
+    (data, frameworks) = resolver.resolve(path)
+    data = dict(data)
+    if frameworks or data.get("frameworks"):
+        merged = dict(frameworks)
+        merged.update(data.get("frameworks") or {})
+        data["frameworks"] = merged
+    return (data, resolver.files)
+
+
+def peak_rss_mb():
+    """
+    :returns float: High-water mark of the resident memory in MB
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OSX and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0)
+    return max_rss / 1024.0
+
+
+def all_environments():
+    """
+    :returns list: The picked environments, then the shotgun_* ones
+    """
+    names = [name for (name, context) in PICKED_ENVIRONMENTS]
+    return names + [n for n in environment_names() if n.startswith("shotgun_")]
+
+
+class _Context(object):
+    # Just what the pick_environment hook looks at.
+    def __init__(self, entity_type, has_step):
+        self.project = {"type": "Project", "id": 1}
+        self.entity = {"type": entity_type, "id": 1} if entity_type else None
+        self.step = {"type": "Step", "id": 1} if has_step else None
+
+
+def check_pick_environment(core_path):
+    """
+    Run the pick_environment hook against a context of each kind.
+
+    :returns list: (expected, picked) environment names that differ
+    """
+    sys.path.insert(0, core_path)
+    module = imp.load_source("pick_environment",
+                             os.path.join(CONFIG_ROOT, "core", "hooks", "pick_environment.py"))
+    hook = module.PickEnvironment(None)
+    mismatches = []
+    for (name, (entity_type, has_step)) in PICKED_ENVIRONMENTS:
+        picked = hook.execute(_Context(entity_type, has_step))
+        if picked != name:
+            mismatches.append((name, picked))
+    return mismatches
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+
+def _app_blocks(data):
+    # (engine, app, settings) for each app of each engine.
+    for (engine_name, engine) in sorted((data.get("engines") or {}).iteritems()):
+        for (app_name, app) in sorted(((engine or {}).get("apps") or {}).iteritems()):
+            yield (engine_name, app_name, app or {})
+
+
+def _count_settings(block):
+    return len([key for key in block if key != "location"])
+
+
+def run_environment(name, options):
+    """
+    Load an environment repeatedly and measure it.
+
+    :returns dict: Results for the environment
+    """
+    env_path = os.path.join(ENV_ROOT, "%s.yml" % name)
+    base_rss = peak_rss_mb()
+
+    runs = []
+    for i in range(options.repeat):
+        timings = {}
+        start_time = time.time()
+        (data, files) = resolve_environment(env_path, timings)
+        runs.append((time.time() - start_time, timings))
+
+    per_file = {}
+    for (wall_time, timings) in runs:
+        for (path, timing) in timings.iteritems():
+            per_file.setdefault(os.path.relpath(path, CONFIG_ROOT), []).append(timing)
+    files_cost = []
+    for (path, file_timings) in per_file.iteritems():
+        files_cost.append({
+            "file": path,
+            "load": _median([t["load"] for t in file_timings]),
+            "resolve": _median([t["resolve"] for t in file_timings]),
+        })
+    files_cost.sort(key=lambda f: f["load"] + f["resolve"], reverse=True)
+
+    apps = []
+    for (engine_name, app_name, block) in _app_blocks(data):
+        start_time = time.time()
+        copy.deepcopy(block)
+        apps.append({
+            "engine": engine_name,
+            "app": app_name,
+            "settings": _count_settings(block),
+            "size": len(cPickle.dumps(block, cPickle.HIGHEST_PROTOCOL)),
+            "copy": time.time() - start_time,
+        })
+    apps.sort(key=lambda a: a["size"], reverse=True)
+
+    engines = data.get("engines") or {}
+    engine_settings = sum(_count_settings(dict((k, v) for (k, v) in (e or {}).iteritems() if k != "apps"))
+                          for e in engines.values())
+
+    return {
+        "environment": name,
+        "files": len(files),
+        "load": _median([sum(t["load"] for t in timings.values()) for (w, timings) in runs]),
+        "resolve": _median([sum(t["resolve"] for t in timings.values()) for (w, timings) in runs]),
+        "wall_time": _median([w for (w, timings) in runs]),
+        "engines": len(engines),
+        "apps": len(apps),
+        "frameworks": len(data.get("frameworks") or {}),
+        "settings": engine_settings + sum(a["settings"] for a in apps),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - base_rss,
+        "costliest_files": files_cost[:options.top],
+        "costliest_apps": apps[:options.top],
+    }
+
+
+def run_environment_process(name, args):
+    """
+    Run the benchmark of an environment in a new process.
+
+    :returns dict: Results for the environment
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-environment", name] + args
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    (output, errors) = process.communicate()
+    if process.returncode:
+        raise RuntimeError("Environment %s failed with exit code %d" % (name, process.returncode))
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_results(results):
+    print("%-26s %5s %5s %4s %5s %6s %9s %9s %9s %8s" % (
+        "environment", "files", "engns", "apps", "fwks", "setngs",
+        "load ms", "refs ms", "total ms", "peak MB"))
+    for r in results:
+        print("%-26s %5d %5d %4d %5d %6d %9.1f %9.1f %9.1f %8.1f" % (
+            r["environment"], r["files"], r["engines"], r["apps"], r["frameworks"], r["settings"],
+            r["load"] * 1000, r["resolve"] * 1000, r["wall_time"] * 1000, r["peak_rss_mb"]))
+
+    # Files are shared between environments, so add their cost up.
+    files = {}
+    for r in results:
+        for f in r["costliest_files"]:
+            entry = files.setdefault(f["file"], {"time": 0.0, "environments": 0})
+            entry["time"] += f["load"] + f["resolve"]
+            entry["environments"] += 1
+    print("")
+    print("Costliest files (load + resolve, summed over environments):")
+    for (path, entry) in sorted(files.items(), key=lambda i: i[1]["time"], reverse=True):
+        print("  %-40s %9.1f ms in %d environments" % (path, entry["time"] * 1000, entry["environments"]))
+
+    print("")
+    print("Costliest app blocks (resolved size):")
+    apps = [(a, r["environment"]) for r in results for a in r["costliest_apps"]]
+    apps.sort(key=lambda i: i[0]["size"], reverse=True)
+    for (a, environment) in apps[:10]:
+        print("  %-22s %-20s %-28s %4d settings %8d bytes" % (
+            environment, a["engine"], a["app"], a["settings"], a["size"]))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--environments", default=",".join(all_environments()),
+                      help="Comma separated environments to load")
+    parser.add_option("--repeat", type="int", default=5, help="Number of loads per environment")
+    parser.add_option("--loader", choices=["pure", "c"], default="pure",
+                      help="YAML parser, pure python like Toolkit's, or libyaml")
+    parser.add_option("--top", type="int", default=5,
+                      help="Number of costliest files and app blocks to keep per environment")
+    parser.add_option("--output", help="File to write the JSON results to")
+    parser.add_option("--core", help="Path to the tk-core python folder, to check pick_environment")
+    parser.add_option("--run-environment", help=optparse.SUPPRESS_HELP)
+    (options, args) = parser.parse_args()
+
+    global _Loader
+    if options.loader == "pure":
+        _Loader = yaml.SafeLoader
+    elif not hasattr(yaml, "CSafeLoader"):
+        parser.error("PyYAML was built without libyaml")
+
+    if options.run_environment:
+        print(json.dumps(run_environment(options.run_environment, options)))
+        return
+
+    names = [name.strip() for name in options.environments.split(",") if name.strip()]
+    unknown = [name for name in names if name not in environment_names()]
+    if unknown:
+        parser.error("Unknown environment(s) %s" % ", ".join(unknown))
+
+    if options.core:
+        for (expected, picked) in check_pick_environment(options.core):
+            print("pick_environment picked %s instead of %s" % (picked, expected))
+
+    forward_args = ["--repeat", str(options.repeat), "--loader", options.loader,
+                    "--top", str(options.top)]
+    results = [run_environment_process(name, forward_args) for name in names]
+
+    if options.output:
+        run = {
+            "created": datetime.now().isoformat(),
+            "settings": {"repeat": options.repeat, "loader": options.loader},
+            "results": results,
+        }
+        with open(options.output, "w") as output_file:
+            json.dump(run, output_file, indent=2, sort_keys=True)
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Sends a synthetic movie through the chunked, resumable quickdaily transfer to
+the local stand-in upload server, and checks what the server received.
+
+Three transfers are run: one over a clean link, one over a link dropping every
+few chunks, and one interrupted part way and resumed from its state file, as
+after the upload worker exits. Each reports its transfer stats, and whether
+the bandwidth cap held.
+
+The upload jobs of the queue worker are then run against a stand-in Shotgun,
+to check that a job run again once its movie is on the Version doesn't upload
+it a second time.
+
+Usage:
+
+    python quickdaily_upload_benchmark.py [--size-mb 256] [--chunk-mb 8] \\
+        [--max-rate-mbps 400] [--drop-every 3] [--concurrency 1]
+"""
+
+import hashlib
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from turnover_fixtures import CONFIG_ROOT
+from upload_server import StandInUploadServer
+
+sys.path.insert(0, os.path.join(CONFIG_ROOT, "hooks"))
+import quickdaily_upload_queue
+import resumable_upload
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _InterruptingTransport(resumable_upload.TusTransport):
+    # Stops the transfer after a number of chunks, like the worker exiting.
+    def __init__(self, url, chunks):
+        resumable_upload.TusTransport.__init__(self, url)
+        self.chunks = chunks
+
+    def send(self, location, offset, data):
+        if self.chunks <= 0:
+            raise _Interrupted()
+        self.chunks -= 1
+        return resumable_upload.TusTransport.send(self, location, offset, data)
+
+
+class _StandInShotgun(object):
+    # Keeps the uploads made to each entity field, as Shotgun returns them.
+    def __init__(self):
+        self.uploads = []
+        self.fields = {}
+
+    def upload(self, entity_type, entity_id, path, field_name=None, *args, **kwargs):
+        self.uploads.append((entity_type, entity_id, field_name))
+        self.fields[(entity_type, entity_id, field_name)] = {
+            "type": "Attachment", "id": len(self.uploads), "link_type": "upload"}
+        return len(self.uploads)
+
+    def find_one(self, entity_type, filters, fields=None, *args, **kwargs):
+        entity_id = filters[0][2]
+        result = {"type": entity_type, "id": entity_id}
+        for field in fields or []:
+            result[field] = self.fields.get((entity_type, entity_id, field))
+        return result
+
+
+class _StandInTk(object):
+    def __init__(self, shotgun):
+        self.shotgun = shotgun
+
+
+def check_dedup(movie, work_dir):
+    """
+    Run the upload jobs of the queue worker against a stand-in Shotgun: a
+    job run again once its movie is on the Version must not upload it a
+    second time, the same movie submitted to another Version must.
+    """
+    shotgun = _StandInShotgun()
+    quickdaily_upload_queue._tk = _StandInTk(shotgun)
+    index = quickdaily_upload_queue.UploadIndex(os.path.join(work_dir, "uploaded_index.json"))
+    job = {"id": "dedup", "path": movie, "entity_type": "Version", "entity_id": 1,
+           "field": "sg_uploaded_movie", "upload_url": None}
+    other_job = dict(job, id="other", entity_id=2)
+    results = [quickdaily_upload_queue.upload_job(j, work_dir, index=index)
+               for j in (job, job, other_job)]
+    expected = [("Version", 1, "sg_uploaded_movie"), ("Version", 2, "sg_uploaded_movie")]
+    ok = shotgun.uploads == expected and results[1].get("reused_upload")
+    print("%-12s %d uploads for 3 jobs, rerun %s  %s" % (
+        "dedup", len(shotgun.uploads), "reused" if results[1].get("reused_upload") else "uploaded",
+        "ok" if ok else "FAILED"))
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), ""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_movie(path, size):
+    """
+    Write a file of random bytes standing in for a movie.
+    """
+    with open(path, "wb") as movie:
+        block = os.urandom(1024 * 1024)
+        written = 0
+        while written < size:
+            movie.write(block[:size - written])
+            written += len(block)
+
+
+def run_transfers(movie, server, state_dir, options, throttle, transport_factory, concurrency):
+    """
+    Send the movie concurrency times at once through a shared throttle.
+
+    :returns list: (upload url, TransferStats) per transfer
+    """
+    results = [None] * concurrency
+    errors = []
+
+    def send(index):
+        try:
+            results[index] = resumable_upload.upload_file(
+                movie, transport_factory(), os.path.join(state_dir, "%d.json" % index),
+                chunk_size=options.chunk_mb * 1024 * 1024, throttle=throttle,
+                retry_delay=0.1)
+        except Exception, e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def report(name, results, server, expected_hash, max_rate, elapsed):
+    for (location, stats) in results:
+        upload = server.uploads[location.rstrip("/").split("/")[-1]]
+        ok = upload["offset"] == stats.size and _file_hash(upload["path"]) == expected_hash
+        print("%-12s %7.1f MB  %6.2fs  %7.2f MB/s  chunks %3d  retries %2d  resumed at %6.1f MB  %s" % (
+            name, stats.size / 1048576.0, stats.elapsed, stats.rate / 1048576.0, stats.chunks,
+            stats.retries, stats.resumed_from / 1048576.0, "ok" if ok else "CORRUPT"))
+    total = sum(stats.sent for (location, stats) in results)
+    if max_rate:
+        print("%-12s aggregate %.2f MB/s, cap %.2f MB/s" % (
+            "", total / elapsed / 1048576.0, max_rate / 1048576.0))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--size-mb", type="int", default=256, help="Size of the synthetic movie")
+    parser.add_option("--chunk-mb", type="int", default=8, help="Size of the chunks sent")
+    parser.add_option("--max-rate-mbps", type="float", default=0,
+                      help="Bandwidth cap in megabits per second, 0 for no cap")
+    parser.add_option("--drop-every", type="int", default=3,
+                      help="Drop the connection half way through every n-th chunk on the flaky link")
+    parser.add_option("--concurrency", type="int", default=1,
+                      help="Number of transfers sharing the bandwidth cap")
+    (options, args) = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        movie = os.path.join(work_dir, "quickdaily.mov")
+        make_movie(movie, options.size_mb * 1024 * 1024)
+        expected_hash = _file_hash(movie)
+        max_rate = int(options.max_rate_mbps * 125000)
+        state_dir = os.path.join(work_dir, "transfers")
+
+        for (name, drop_every) in (("clean", 0), ("flaky", options.drop_every)):
+            server = StandInUploadServer(storage=os.path.join(work_dir, name), drop_every=drop_every)
+            os.makedirs(server.storage)
+            server.start()
+            try:
+                start_time = time.time()
+                results = run_transfers(movie, server, state_dir, options,
+                                        resumable_upload.Throttle(max_rate),
+                                        lambda: resumable_upload.TusTransport(server.url),
+                                        options.concurrency)
+                report(name, results, server, expected_hash, max_rate, time.time() - start_time)
+            finally:
+                server.stop()
+
+        # Interrupted half way, then resumed from the state file.
+        server = StandInUploadServer(storage=os.path.join(work_dir, "resumed"))
+        os.makedirs(server.storage)
+        server.start()
+        try:
+            chunks = options.size_mb / options.chunk_mb / 2
+            try:
+                run_transfers(movie, server, state_dir, options, None,
+                              lambda: _InterruptingTransport(server.url, chunks), 1)
+            except _Interrupted:
+                pass
+            start_time = time.time()
+            results = run_transfers(movie, server, state_dir, options,
+                                    resumable_upload.Throttle(max_rate),
+                                    lambda: resumable_upload.TusTransport(server.url), 1)
+            report("resumed", results, server, expected_hash, max_rate, time.time() - start_time)
+        finally:
+            server.stop()
+
+        check_dedup(movie, work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
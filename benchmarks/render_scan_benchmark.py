@@ -0,0 +1,146 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Runs scripts/render_scan.py over a synthetic stereo render written where the
+nuke_shot_render_mono_exr template of this configuration puts the renders of
+a made up Shot, with frames dropped from either eye, some zero-byte frames
+and a mis-padded stray frame, and checks it reports exactly these. The
+folders written are removed afterwards.
+
+The scan is timed with and without looking for zero-byte frames, which needs
+a stat per frame, along with the growth of the peak memory.
+
+Usage:
+
+    python render_scan_benchmark.py --core <tk-core>/python \\
+        [--config <pipeline configuration>] [--frames 100000] \\
+        [--drop-every 997] [--empty-every 1009]
+"""
+
+import optparse
+import os
+import resource
+import shutil
+import sys
+import time
+
+from turnover_fixtures import CONFIG_ROOT
+
+RENDER_TEMPLATE = "nuke_shot_render_mono_exr"
+
+# Fields of the synthetic render, the eye and frame aside.
+RENDER_FIELDS = {"Sequence": "BENCH", "Shot": "BENCH_0010", "Step": "comp", "name": "comp",
+                 "version": 3, "width": 4096, "height": 2048}
+
+FIRST_FRAME = 1001
+
+# Frame 1 of the L eye written with the first frame as a prefix.
+STRAY_FRAME = FIRST_FRAME * 10000 + 1
+
+
+def peak_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OSX and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0)
+    return max_rss / 1024.0
+
+
+def make_render(template, options):
+    """
+    Write the frames of both eyes, leaving some out and some empty.
+
+    :returns: (dropped L frames, dropped R frames, empty L frames) tuple of sets
+    """
+    dropped = {"L": set(), "R": set()}
+    empty = set()
+
+    def frame_path(eye, frame):
+        return template.apply_fields(dict(RENDER_FIELDS, eye=eye, SEQ=frame))
+
+    for index in range(options.frames):
+        frame = FIRST_FRAME + index
+        for eye in ("L", "R"):
+            # Drop from the L eye first, then from the R eye.
+            if options.drop_every and index % options.drop_every == (0 if eye == "L" else 1):
+                dropped[eye].add(frame)
+                continue
+            is_empty = eye == "L" and options.empty_every and index % options.empty_every == 2
+            if is_empty:
+                empty.add(frame)
+            with open(frame_path(eye, frame), "wb") as f:
+                f.write("" if is_empty else "x")
+    with open(frame_path("L", STRAY_FRAME), "wb") as f:
+        f.write("x")
+    return (dropped["L"], dropped["R"], empty)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--core", help="Path to the tk-core python folder")
+    parser.add_option("--config", default=os.path.dirname(CONFIG_ROOT),
+                      help="Pipeline configuration to take the templates from")
+    parser.add_option("--frames", type="int", default=100000, help="Frames per eye")
+    parser.add_option("--drop-every", type="int", default=997, help="Drop every n-th frame of each eye")
+    parser.add_option("--empty-every", type="int", default=1009, help="Empty every n-th frame of the L eye")
+    (options, args) = parser.parse_args()
+    if not options.core:
+        parser.error("--core is required")
+
+    sys.path.insert(0, options.core)
+    sys.path.insert(0, os.path.join(CONFIG_ROOT, "scripts"))
+    import render_scan
+    import sgtk
+
+    tk = sgtk.sgtk_from_path(options.config)
+    render_templates = render_scan.load_render_templates(tk)
+    template = tk.templates[RENDER_TEMPLATE]
+    folder = os.path.dirname(template.apply_fields(dict(RENDER_FIELDS, eye="L", SEQ=FIRST_FRAME)))
+    # Only the folders made here are removed afterwards.
+    top_folder = folder
+    while not os.path.exists(os.path.dirname(top_folder)):
+        top_folder = os.path.dirname(top_folder)
+    if os.path.exists(top_folder):
+        parser.error("%s already exists" % folder)
+    os.makedirs(folder)
+    try:
+        start_time = time.time()
+        (dropped_left, dropped_right, empty) = make_render(template, options)
+        print("%d frames per eye written in %s in %.1fs" % (options.frames, folder, time.time() - start_time))
+
+        base_rss = peak_rss_mb()
+        for check_sizes in (False, True):
+            start_time = time.time()
+            reports = render_scan.scan([folder], render_templates, check_sizes=check_sizes)
+            elapsed = time.time() - start_time
+            report = reports[0]
+            last = FIRST_FRAME + options.frames - 1
+            expected = {
+                "L": render_scan.frame_ranges(f for f in range(FIRST_FRAME, last + 1) if f in dropped_left),
+                "R": render_scan.frame_ranges(f for f in range(FIRST_FRAME, last + 1) if f in dropped_right),
+            }
+            ok = (len(reports) == 1 and report["template"] == RENDER_TEMPLATE and
+                  report["eyes"]["L"]["missing"] == expected["L"] and
+                  report["eyes"]["R"]["missing"] == expected["R"] and
+                  report["eyes"]["L"]["stray"] == [str(STRAY_FRAME)] and
+                  report["eyes"]["R"]["stray"] == [] and
+                  report["left_only"] == expected["R"] and report["right_only"] == expected["L"] and
+                  report["eyes"]["L"]["empty"] == (render_scan.frame_ranges(sorted(empty))
+                                                   if check_sizes else []))
+            print("%-12s %8.2fs %10.0f files/s  peak memory +%.1f MB  %s" % (
+                "with sizes" if check_sizes else "names only", elapsed,
+                2 * options.frames / elapsed, peak_rss_mb() - base_rss, "ok" if ok else "WRONG REPORT"))
+    finally:
+        shutil.rmtree(top_folder)
+
+
+if __name__ == "__main__":
+    main()
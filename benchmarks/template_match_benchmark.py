@@ -0,0 +1,189 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compares finding the templates of a path by validating it against every path
+template of the configuration, one by one, with narrowing the templates down
+through the trie of scripts/template_index.py first.
+
+The paths are the render and publish paths of a number of synthetic Shots and
+Assets, built from the templates: frames of the mono and stereo Nuke renders,
+Houdini renders, review movies and the published scene files, plus the stray
+files found next to them, like .DS_Store and .tmp frames, which match no
+template. Both ways must find the same templates and fields for every path.
+
+Usage:
+
+    python template_match_benchmark.py --core <tk-core>/python \\
+        [--config <pipeline configuration>] [--shots 10] [--frames 12] \\
+        [--repeat 3] [--output results.json]
+"""
+
+import json
+import optparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from turnover_fixtures import CONFIG_ROOT
+
+STRAY_FILES = [".DS_Store", "Thumbs.db", "render.log"]
+
+
+def _value(sgtk, key, shot_index, version, frame, eye):
+    # Plausible value for a key, the same for a given Shot and version.
+    if key.name == "eye":
+        return eye
+    if isinstance(key, sgtk.SequenceKey):
+        return frame
+    if key.choices:
+        choices = sorted(key.choices)
+        return choices[shot_index % len(choices)]
+    if isinstance(key, sgtk.IntegerKey):
+        return {"width": 4096, "height": 2048, "YYYY": 2016, "MM": 6, "DD": 14}.get(key.name, version)
+    return {
+        "Sequence": "JNT_%02d" % (shot_index / 10),
+        "Shot": "JNT_%04d" % shot_index,
+        "Asset": "prop%03d" % shot_index,
+        "sg_asset_type": "Prop",
+        "Step": ["comp", "light", "fx"][shot_index % 3],
+    }.get(key.name, ["main", "comp", "precomp"][shot_index % 3])
+
+
+def build_paths(sgtk, templates, options):
+    """
+    Build the render and publish paths of the synthetic Shots and Assets.
+
+    :returns list: Absolute paths, shuffled
+    """
+    picked = [t for (name, t) in sorted(templates.iteritems())
+              if isinstance(t, sgtk.TemplatePath) and ("render" in name or "publish" in name)]
+    paths = []
+
+    def apply_values(template, shot_index, version, frame, eye):
+        fields = dict((name, _value(sgtk, key, shot_index, version, frame, eye))
+                      for (name, key) in template.keys.iteritems())
+        try:
+            return [template.apply_fields(fields)]
+        except sgtk.TankError:
+            # Keys this benchmark has no value for, like timestamps.
+            return []
+
+    for shot_index in range(options.shots):
+        for version in (1, 2):
+            for template in picked:
+                if "SEQ" not in template.keys:
+                    paths.extend(apply_values(template, shot_index, version, 1001, "L"))
+                    continue
+                frames = []
+                eyes = ["L", "R"] if "eye" in template.keys else [None]
+                for eye in eyes:
+                    for frame in range(1001, 1001 + options.frames):
+                        frames.extend(apply_values(template, shot_index, version, frame, eye))
+                if frames:
+                    frame_dir = os.path.dirname(frames[-1])
+                    frames.extend(os.path.join(frame_dir, name) for name in STRAY_FILES)
+                    frames.append(frames[-1 - len(STRAY_FILES)] + ".tmp")
+                paths.extend(frames)
+    random.Random(0).shuffle(paths)
+    return paths
+
+
+def match_linear(sgtk, templates, path):
+    matches = []
+    for (name, template) in sorted(templates.iteritems()):
+        if isinstance(template, sgtk.TemplatePath) and template.validate(path):
+            matches.append((name, template.get_fields(path)))
+    return matches
+
+
+def _time(function, paths, repeat):
+    best = None
+    for i in range(repeat):
+        start_time = time.time()
+        results = [function(path) for path in paths]
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return (best, results)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--core", help="Path to the tk-core python folder")
+    parser.add_option("--config", default=os.path.dirname(CONFIG_ROOT),
+                      help="Pipeline configuration to take the templates from")
+    parser.add_option("--shots", type="int", default=10, help="Number of synthetic Shots and Assets")
+    parser.add_option("--frames", type="int", default=12, help="Frames per render version")
+    parser.add_option("--repeat", type="int", default=3, help="Runs per method, the best is kept")
+    parser.add_option("--output", help="File to write the JSON results to")
+    (options, args) = parser.parse_args()
+    if not options.core:
+        parser.error("--core is required")
+
+    sys.path.insert(0, options.core)
+    sys.path.insert(0, os.path.join(CONFIG_ROOT, "scripts"))
+    import template_index
+    import sgtk
+
+    start_time = time.time()
+    templates = sgtk.sgtk_from_path(options.config).templates
+    load_time = time.time() - start_time
+    start_time = time.time()
+    index = template_index.TemplateIndex(templates)
+    build_time = time.time() - start_time
+
+    paths = build_paths(sgtk, templates, options)
+    (linear_time, linear_results) = _time(lambda p: match_linear(sgtk, templates, p), paths,
+                                          options.repeat)
+    (trie_time, trie_results) = _time(index.match, paths, options.repeat)
+    candidates = [len(index.candidates(path)) for path in paths]
+
+    mismatches = [path for (path, linear, trie) in zip(paths, linear_results, trie_results) if linear != trie]
+    results = {
+        "templates": len([t for t in templates.itervalues() if isinstance(t, sgtk.TemplatePath)]),
+        "trie_nodes": index.node_count,
+        "paths": len(paths),
+        "matched": len([r for r in trie_results if r]),
+        "load_time": load_time,
+        "build_time": build_time,
+        "linear_time": linear_time,
+        "trie_time": trie_time,
+        "mean_candidates": sum(candidates) / float(len(candidates)),
+        "max_candidates": max(candidates),
+        "mismatches": len(mismatches),
+    }
+
+    print("%d path templates, trie of %d nodes built in %.2f ms (templates read in %.1f ms)" % (
+        results["templates"], results["trie_nodes"], build_time * 1000, load_time * 1000))
+    print("%d paths, %d matching a template" % (results["paths"], results["matched"]))
+    print("%-8s %10s %12s %12s" % ("method", "total ms", "us per path", "paths/s"))
+    for (name, elapsed) in (("linear", linear_time), ("trie", trie_time)):
+        print("%-8s %10.1f %12.2f %12.0f" % (name, elapsed * 1000, elapsed * 1e6 / len(paths),
+                                             len(paths) / elapsed))
+    print("speedup %.1fx, %.2f candidates per path on average, %d at most" % (
+        linear_time / trie_time, results["mean_candidates"], results["max_candidates"]))
+    for path in mismatches[:10]:
+        print("MISMATCH %s" % path)
+
+    if options.output:
+        run = {
+            "created": datetime.now().isoformat(),
+            "settings": {"shots": options.shots, "frames": options.frames, "repeat": options.repeat},
+            "results": results,
+        }
+        with open(options.output, "w") as output_file:
+            json.dump(run, output_file, indent=2, sort_keys=True)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
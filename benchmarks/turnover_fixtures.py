@@ -0,0 +1,266 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Synthetic turnover data and stand-ins for Shotgun, the Toolkit app and the
+progress thread, so the turnover report hook can be run offline.
+"""
+
+import imp
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+CONFIG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_report_hook_module(core_path, app_hooks_path):
+    """
+    Load the plate turnover report hook as a regular module.
+
+    :param core_path: Path to the tk-core python folder
+    :param app_hooks_path: Path to the tk-shotgun-reportlab hooks folder
+    :returns: The loaded hook module
+    """
+    sys.path.insert(0, core_path)
+    sys.path.insert(0, app_hooks_path)
+    return imp.load_source("plate_turnover_report",
+        os.path.join(CONFIG_ROOT, "hooks", "plate_turnover_report.py"))
+
+
+def synthetic_shot(shot_id, segments=2, versions=1, notes=3):
+    """
+    Build a Shot plus its turnover Segments, Versions and Notes with values
+    typical of a real turnover.
+
+    :returns tuple: (shot, segments, versions, notes)
+    """
+    code = "JNT_%04d" % shot_id
+    shot = {
+        "type": "Shot",
+        "id": shot_id,
+        "code": code,
+        "project.Project.sg_release_title": "Benchmark Release",
+        "sg_turnover_notes___linked_field": "Paint out rig, match grade to hero plate.",
+        "sg_awarded_vendor": {"type": "HumanUser", "id": 1, "name": "Vendor"},
+        "sg_awarded_vendor.HumanUser.sg_vendor_code": "VND",
+    }
+    shot_segments = [{
+        "code": "%s_plate_%d" % (code, i),
+        "description": "Main plate %d" % i,
+        "sg_duration": 4.5,
+        "sg_start": 3600.0 + i,
+        "sg_end": 3604.5 + i,
+        "sg_timeline_start": 1001,
+        "sg_timeline_end": 1109,
+    } for i in range(segments)]
+    shot_versions = [{"code": "%s_v%03d" % (code, i + 1), "description": "Temp comp"}
+                     for i in range(versions)]
+    shot_notes = [{"content": "Note %d for %s: tighten the edge on the left "
+                              "eye and match the grain to the plate." % (i, code)}
+                  for i in range(notes)]
+    return (shot, shot_segments, shot_versions, shot_notes)
+
+
+class MockShotgun(object):
+    """
+    In memory stand-in for a Shotgun connection, seeded with synthetic
+    Shots and their turnover data. Supports the find, upload, update and
+    download_attachment calls the turnover report makes, and simulates a
+    fixed latency per call plus the time to send uploads and downloads over
+    a link with the given bandwidth.
+    """
+    def __init__(self, shots=100, segments=2, versions=1, notes=3,
+                 segment_entity="CustomEntity01", latency=0.0, bandwidth=None):
+        """
+        :param shots: Number of Shots to create
+        :param segments: Number of turnover Segments per Shot
+        :param versions: Number of turnover Versions per Shot
+        :param notes: Number of open turnover Notes per Shot
+        :param segment_entity: Entity type of the Segments
+        :param latency: Seconds each call takes to round-trip
+        :param bandwidth: Upload bandwidth in bytes per second, unlimited if None
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._entities = {"Shot": [], segment_entity: [], "Version": [],
+                          "Note": [], "Attachment": []}
+        next_id = 1
+        for shot_id in range(1, shots + 1):
+            (shot, shot_segments, shot_versions, shot_notes) = synthetic_shot(
+                shot_id, segments, versions, notes)
+            self._entities["Shot"].append(shot)
+            for (entity_type, link_field, entities) in [
+                    (segment_entity, "sg_shot_1.Shot.id", shot_segments),
+                    ("Version", "entity.Shot.id", shot_versions),
+                    ("Note", "note_links.Shot.id", shot_notes)]:
+                for entity in entities:
+                    entity.update({"type": entity_type, "id": next_id,
+                                   link_field: shot_id, "tag_list": ["turnover"],
+                                   "sg_status_list": "opn"})
+                    self._entities[entity_type].append(entity)
+                    next_id += 1
+
+    def _call(self, name, seconds):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if seconds:
+            time.sleep(seconds)
+
+    def _matches(self, entity, filters):
+        for (field, operator, value) in filters:
+            entity_value = entity.get(field)
+            if operator == "is":
+                if entity_value != value:
+                    return False
+            elif operator == "in":
+                if entity_value not in value:
+                    return False
+            elif operator == "name_is":
+                if value not in (entity_value or []):
+                    return False
+            else:
+                raise ValueError("Unsupported filter operator '%s'" % operator)
+        return True
+
+    def find(self, entity_type, filters, fields=None, *args, **kwargs):
+        self._call("find", self.latency)
+        results = []
+        for entity in self._entities.get(entity_type, []):
+            if self._matches(entity, filters):
+                result = {"type": entity_type, "id": entity["id"]}
+                for field in fields or []:
+                    result[field] = entity.get(field)
+                results.append(result)
+        return results
+
+    def find_one(self, entity_type, filters, fields=None, *args, **kwargs):
+        results = self.find(entity_type, filters, fields)
+        return results[0] if results else None
+
+    def change_notes(self, shot_ids):
+        """
+        Edit the first Note of each given Shot, so their report data changes.
+
+        :param shot_ids: Ids of the Shots to change
+        """
+        shot_ids = set(shot_ids)
+        for note in self._entities["Note"]:
+            if note["note_links.Shot.id"] in shot_ids:
+                note["content"] += " Updated."
+                shot_ids.discard(note["note_links.Shot.id"])
+
+    def _transfer_time(self, num_bytes):
+        if self.bandwidth:
+            return num_bytes / float(self.bandwidth)
+        return 0.0
+
+    def upload(self, entity_type, entity_id, path, field_name=None, *args, **kwargs):
+        self._call("upload", self.latency + self._transfer_time(os.path.getsize(path)))
+        with open(path, "rb") as upload_file:
+            data = upload_file.read()
+        with self._lock:
+            attachment = {"type": "Attachment",
+                          "id": len(self._entities["Attachment"]) + 1,
+                          "this_file": os.path.basename(path),
+                          "data": data}
+            self._entities["Attachment"].append(attachment)
+        return attachment["id"]
+
+    def download_attachment(self, attachment, file_path=None, *args, **kwargs):
+        attachment = self._entities["Attachment"][attachment["id"] - 1]
+        self._call("download_attachment",
+                   self.latency + self._transfer_time(len(attachment["data"])))
+        if file_path is None:
+            return attachment["data"]
+        with open(file_path, "wb") as download_file:
+            download_file.write(attachment["data"])
+        return file_path
+
+    def update(self, entity_type, entity_id, data, *args, **kwargs):
+        self._call("update", self.latency)
+        return dict(data, type=entity_type, id=entity_id)
+
+
+class _NullSignal(object):
+    def __call__(self, *args, **kwargs):
+        pass
+
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class NullThread(object):
+    """
+    Stand-in for the progress thread the report hooks are run in. Any
+    progress signal sent to it is ignored.
+    """
+    def __getattr__(self, name):
+        return _NullSignal()
+
+
+class _PipelineConfiguration(object):
+    def get_config_location(self):
+        return CONFIG_ROOT
+
+
+class _Templates(dict):
+    def get(self, name, default=None):
+        return name
+
+
+class _Tank(object):
+    def __init__(self):
+        self.templates = _Templates()
+        self.pipeline_configuration = _PipelineConfiguration()
+
+
+class MockReportApp(object):
+    """
+    Stand-in for the tk-shotgun-reportlab app the report hooks are run by.
+    """
+    def __init__(self, shotgun, cache_location, verbose=False):
+        """
+        :param shotgun: Shotgun connection, ie. a MockShotgun
+        :param cache_location: Folder the report caches its data in
+        :param verbose: True to print the app's log messages
+        """
+        self.shotgun = shotgun
+        self.cache_location = cache_location
+        self.sgtk = self.tank = _Tank()
+        self._verbose = verbose
+
+    def get_setting(self, name, default=None):
+        if name == "jaunt_logo_image":
+            return "{config}/icons/jaunt_logo.jpg"
+        return default
+
+    def evaluate_template(self, template):
+        return datetime.now().strftime("%y_%m_%d_%H%M%S")
+
+    def _log(self, level, msg):
+        if self._verbose:
+            sys.stderr.write("%s: %s\n" % (level, msg))
+
+    def log_debug(self, msg):
+        self._log("DEBUG", msg)
+
+    def log_info(self, msg):
+        self._log("INFO", msg)
+
+    def log_warning(self, msg):
+        self._log("WARNING", msg)
+
+    def log_error(self, msg):
+        self._log("ERROR", msg)
@@ -0,0 +1,105 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measures the per-Shot overhead of building a Turnover PDF with the report
+layout rebuilt, and the logo resolved from the app settings, for every Shot
+(the old behaviour) versus one layout shared by every Shot in the run.
+
+Both variants are warmed up first, then run --repeats times each, in
+alternating order, and the median of the runs is reported.
+
+Usage:
+
+    python turnover_layout_benchmark.py --core <tk-core>/python \\
+        --app-hooks <tk-shotgun-reportlab>/hooks [--shots 100] [--repeats 5]
+"""
+
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+from turnover_fixtures import MockReportApp, load_report_hook_module, synthetic_shot
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+
+def time_renders(module, hook, shots, out_dir, shared_layout):
+    """
+    Render a PDF per Shot, optionally resolving the logo and rebuilding the
+    layout for each one, as the hook did before the layout was shared.
+
+    :returns float: Seconds per Shot
+    """
+    start_time = time.time()
+    if shared_layout:
+        hook._layout = module._ReportLayout(hook._jaunt_logo())
+    for (shot, segments, versions, notes) in shots:
+        if not shared_layout:
+            hook._layout = module._ReportLayout(hook._jaunt_logo())
+        filename = os.path.join(out_dir, "%s.pdf" % shot["code"])
+        hook.buildShotPDF(filename, shot, segments, versions, notes)
+    return (time.time() - start_time) / len(shots)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--core", help="Path to the tk-core python folder")
+    parser.add_option("--app-hooks", help="Path to the tk-shotgun-reportlab hooks folder")
+    parser.add_option("--shots", type="int", default=100, help="Number of Shots to render")
+    parser.add_option("--repeats", type="int", default=5, help="Number of runs of each variant")
+    (options, args) = parser.parse_args()
+    if not options.core or not options.app_hooks:
+        parser.error("--core and --app-hooks are required")
+
+    module = load_report_hook_module(options.core, options.app_hooks)
+    out_dir = tempfile.mkdtemp()
+    try:
+        hook = module.ShotPlateTurnover(None)
+        hook._app = MockReportApp(None, os.path.join(out_dir, "cache"))
+        hook._timecode = module._TimecodeFormatter()
+        hook._report_config = {}
+        shots = [synthetic_shot(i) for i in range(1, options.shots + 1)]
+
+        # Load reportlab's fonts and the logo into the OS caches for both.
+        time_renders(module, hook, shots[:10], out_dir, False)
+        time_renders(module, hook, shots[:10], out_dir, True)
+
+        # Cost of the logo lookup and the layout on their own, which is what
+        # sharing the layout saves per Shot.
+        start_time = time.time()
+        for i in range(options.shots):
+            module._ReportLayout(hook._jaunt_logo())
+        layout_time = (time.time() - start_time) / options.shots
+
+        runs = {False: [], True: []}
+        for repeat in range(max(1, options.repeats)):
+            order = (False, True) if repeat % 2 == 0 else (True, False)
+            for shared_layout in order:
+                runs[shared_layout].append(time_renders(module, hook, shots, out_dir, shared_layout))
+    finally:
+        shutil.rmtree(out_dir)
+
+    before = _median(runs[False])
+    after = _median(runs[True])
+    print("Shots rendered                   : %d x %d runs" % (options.shots, len(runs[True])))
+    print("Logo and layout build per Shot   : %.2f ms" % (layout_time * 1000))
+    print("Render per Shot, per-Shot layout : %.2f ms (median)" % (before * 1000))
+    print("Render per Shot, shared layout   : %.2f ms (median)" % (after * 1000))
+    print("Saved per Shot                   : %.2f ms" % ((before - after) * 1000))
+
+
+if __name__ == "__main__":
+    main()
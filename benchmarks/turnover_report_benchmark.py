@@ -0,0 +1,323 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Runs the plate turnover report end to end against a mock Shotgun seeded with
+synthetic Shots, Segments, Versions and Notes, and records the wall time and
+memory of the fetch, download, render, upload and package phases.
+
+Each scenario is run in its own process so peak memory isn't carried over
+from one scenario to the next. Results are written as JSON, and can be
+compared against the results of a previous run.
+
+The incremental scenario runs the report once to upload every report, edits
+the Notes of some of the Shots, then times a second run zipping the reports,
+which renders the changed Shots and downloads the last report of the others.
+
+Usage:
+
+    python turnover_report_benchmark.py --core <tk-core>/python \\
+        --app-hooks <tk-shotgun-reportlab>/hooks \\
+        [--scenarios 10_shots,100_shots] [--output results.json] \\
+        [--compare previous_results.json]
+
+Phase times are the total time spent in each phase. Uploads run in
+background threads while rendering, so phase times can add up to more than
+the wall time. The memory of a phase is how much the peak memory of the
+process grew while it ran; for phases running at the same time, the growth
+is counted for each of them.
+"""
+
+import json
+import optparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from turnover_fixtures import MockReportApp, MockShotgun, NullThread
+from turnover_fixtures import load_report_hook_module
+
+# (Scenario name, MockShotgun seed data, report settings) tuples. The
+# 'changed_shots' setting is the number of Shots edited between the two runs
+# of an incremental scenario.
+SCENARIOS = [
+    ("10_shots", {"shots": 10}, {}),
+    ("100_shots", {"shots": 100}, {}),
+    ("1000_shots", {"shots": 1000}, {}),
+    ("heavy_notes", {"shots": 100, "notes": 200}, {}),
+    ("incremental_zip", {"shots": 100},
+     {"incremental": True, "zip_all_files": True, "changed_shots": 10}),
+]
+
+PHASES = ["fetch", "download", "render", "upload", "package"]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    :returns float: High-water mark of the resident memory in MB
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on OSX and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return max_rss / (1024.0 * 1024.0)
+    return max_rss / 1024.0
+
+
+class PhaseRecorder(object):
+    """
+    Accumulates the time spent in each phase of the report, and how much the
+    memory high-water mark of the process grew during each phase. The
+    high-water mark only ever grows, so it is compared before and after each
+    call instead of being read at the end of a phase, which would include
+    the peaks of every phase before it.
+    """
+    def __init__(self):
+        self.phases = dict((name, {"time": 0.0, "calls": 0, "peak_rss_growth_mb": 0.0})
+                           for name in PHASES)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, rss_growth):
+        with self._lock:
+            phase = self.phases[name]
+            phase["time"] += seconds
+            phase["calls"] += 1
+            phase["peak_rss_growth_mb"] += rss_growth
+
+    def wrap(self, name, fn):
+        """
+        :returns: Callable that runs fn and records its time under name
+        """
+        def timed(*args, **kwargs):
+            start_time = time.time()
+            start_rss = peak_rss_mb()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.time() - start_time, peak_rss_mb() - start_rss)
+        return timed
+
+    def wrap_iterator(self, name, iterator):
+        """
+        :returns: Iterator over iterator that records the time spent waiting
+                  on each item under name
+        """
+        while True:
+            start_time = time.time()
+            start_rss = peak_rss_mb()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.record(name, time.time() - start_time, peak_rss_mb() - start_rss)
+                return
+            self.record(name, time.time() - start_time, peak_rss_mb() - start_rss)
+            yield item
+
+
+def run_scenario(module, name, seed, settings, options):
+    """
+    Run the report for one scenario in this process.
+
+    :returns dict: Results for the scenario
+    """
+    settings = dict(settings)
+    changed_shots = settings.pop("changed_shots", 0)
+    shotgun = MockShotgun(latency=options.latency, bandwidth=options.bandwidth, **seed)
+    shot_ids = range(1, seed["shots"] + 1)
+    work_dir = tempfile.mkdtemp()
+    try:
+        app = MockReportApp(shotgun, os.path.join(work_dir, "cache"), options.verbose)
+        report_config = {
+            "short_name": "plate_turnover_report",
+            "valid_entity_types": ["Shot"],
+            "segment_entity": "CustomEntity01",
+            "date_time_format": "yy_mm_dd_format",
+            "render_processes": options.render_processes,
+            "upload_threads": options.upload_threads,
+            "upload_retries": 0,
+            "fetch_threads": 3,
+            "fetch_chunk_size": options.fetch_chunk_size,
+            "incremental": False,
+        }
+        report_config.update(settings)
+
+        # An incremental run only renders what changed since the last run,
+        # which uploads the reports it compares against.
+        if report_config["incremental"]:
+            out_dir = os.path.join(work_dir, "first_run")
+            os.makedirs(out_dir)
+            module.ShotPlateTurnover(None).execute(
+                app, NullThread(), "Shot", shot_ids, 0, out_dir, report_config)
+            shotgun.change_notes(shot_ids[:changed_shots])
+            shotgun.calls = {}
+
+        # Time each phase by wrapping the methods that implement it. When
+        # zipping, the reports are added to the archive as they're rendered.
+        recorder = PhaseRecorder()
+        hook = module.ShotPlateTurnover(None)
+        hook._fetch_turnover_data = recorder.wrap("fetch", hook._fetch_turnover_data)
+        hook._deliver_previous_reports = recorder.wrap(
+            "download", hook._deliver_previous_reports)
+        render_pdfs = hook._render_pdfs
+        hook._render_pdfs = lambda jobs: recorder.wrap_iterator("render", render_pdfs(jobs))
+        hook._attach_report_to_sg_entity = recorder.wrap(
+            "upload", hook._attach_report_to_sg_entity)
+        module.package_reports = recorder.wrap("package", module.package_reports)
+        zip_file_class = module.zipfile.ZipFile
+
+        class TimedZipFile(zip_file_class):
+            write = recorder.wrap("package", zip_file_class.write)
+            close = recorder.wrap("package", zip_file_class.close)
+        module.zipfile.ZipFile = TimedZipFile
+
+        out_dir = os.path.join(work_dir, "output")
+        os.makedirs(out_dir)
+        start_time = time.time()
+        try:
+            hook.execute(app, NullThread(), "Shot", shot_ids, 0, out_dir, report_config)
+        finally:
+            module.zipfile.ZipFile = zip_file_class
+        wall_time = time.time() - start_time
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "scenario": name,
+        "seed": seed,
+        "settings": settings,
+        "changed_shots": changed_shots,
+        "wall_time": wall_time,
+        "shots_per_second": seed["shots"] / wall_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "render_workers_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "shotgun_calls": shotgun.calls,
+        "phases": recorder.phases,
+    }
+
+
+def run_scenario_process(name, args):
+    """
+    Run a scenario in a new process.
+
+    :returns dict: Results for the scenario
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-scenario", name] + args
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    (output, errors) = process.communicate()
+    if process.returncode:
+        raise RuntimeError("Scenario %s failed with exit code %d" % (name, process.returncode))
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_results(results, baseline=None):
+    """
+    Print a summary of the results, with the change from the baseline
+    results for each scenario if given.
+    """
+    baseline_by_name = dict((r["scenario"], r) for r in (baseline or {}).get("results", []))
+
+    def fmt(value, old_value):
+        text = "%8.2f" % value
+        if old_value:
+            text += " (%+6.1f%%)" % (100.0 * (value - old_value) / old_value)
+        return text
+
+    for result in results:
+        old = baseline_by_name.get(result["scenario"]) or {}
+        print("%s %s %s" % (result["scenario"], json.dumps(result["seed"], sort_keys=True),
+                            json.dumps(result.get("settings") or {}, sort_keys=True)))
+        print("  wall time (s)     : %s" % fmt(result["wall_time"], old.get("wall_time")))
+        print("  shots per second  : %s" % fmt(result["shots_per_second"],
+                                               old.get("shots_per_second")))
+        print("  peak memory (MB)  : %s" % fmt(result["peak_rss_mb"], old.get("peak_rss_mb")))
+        for phase in PHASES:
+            values = result["phases"][phase]
+            old_values = (old.get("phases") or {}).get(phase) or {}
+            print("  %-8s time (s) : %s   peak memory growth (MB) : %s" % (
+                phase, fmt(values["time"], old_values.get("time")),
+                fmt(values["peak_rss_growth_mb"], old_values.get("peak_rss_growth_mb"))))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--core", help="Path to the tk-core python folder")
+    parser.add_option("--app-hooks", help="Path to the tk-shotgun-reportlab hooks folder")
+    parser.add_option("--scenarios", default=",".join(s[0] for s in SCENARIOS),
+                      help="Comma separated scenarios to run")
+    parser.add_option("--latency", type="float", default=0.05,
+                      help="Seconds each Shotgun call takes to round-trip")
+    parser.add_option("--bandwidth", type="float", default=None,
+                      help="Upload bandwidth in bytes per second")
+    parser.add_option("--render-processes", type="int", default=1)
+    parser.add_option("--upload-threads", type="int", default=1)
+    parser.add_option("--fetch-chunk-size", type="int", default=200)
+    parser.add_option("--output", help="File to write the JSON results to")
+    parser.add_option("--compare", help="JSON results of a previous run to compare against")
+    parser.add_option("--verbose", action="store_true", default=False)
+    parser.add_option("--run-scenario", help=optparse.SUPPRESS_HELP)
+    (options, args) = parser.parse_args()
+    if not options.core or not options.app_hooks:
+        parser.error("--core and --app-hooks are required")
+
+    scenarios = dict((name, (seed, settings)) for (name, seed, settings) in SCENARIOS)
+    if options.run_scenario:
+        module = load_report_hook_module(options.core, options.app_hooks)
+        (seed, settings) = scenarios[options.run_scenario]
+        result = run_scenario(module, options.run_scenario, seed, settings, options)
+        print(json.dumps(result))
+        return
+
+    names = [name.strip() for name in options.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        parser.error("Unknown scenario(s) %s, choose from %s" %
+                     (", ".join(unknown), ", ".join(s[0] for s in SCENARIOS)))
+
+    # Forward everything but the options that only apply to this process.
+    forward_args = []
+    skip_next = False
+    for arg in sys.argv[1:]:
+        if skip_next:
+            skip_next = False
+        elif arg in ("--scenarios", "--output", "--compare"):
+            skip_next = True
+        elif not arg.split("=")[0] in ("--scenarios", "--output", "--compare"):
+            forward_args.append(arg)
+
+    results = [run_scenario_process(name, forward_args) for name in names]
+    run = {
+        "created": datetime.now().isoformat(),
+        "settings": {
+            "latency": options.latency,
+            "bandwidth": options.bandwidth,
+            "render_processes": options.render_processes,
+            "upload_threads": options.upload_threads,
+            "fetch_chunk_size": options.fetch_chunk_size,
+        },
+        "results": results,
+    }
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(run, output_file, indent=2, sort_keys=True)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
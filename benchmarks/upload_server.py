@@ -0,0 +1,171 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Local stand-in for the resumable upload server the quickdaily movies are sent
+to, speaking the core tus protocol. Uploads are written to a directory.
+
+The server can drop connections part way through chunks, to exercise resumed
+transfers, and cap its own receive rate, to stand in for a slow uplink.
+
+Usage:
+
+    python upload_server.py --port 8080 --storage /tmp/uploads [--drop-every 3]
+"""
+
+import BaseHTTPServer
+import SocketServer
+import base64
+import optparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+_BLOCK_SIZE = 64 * 1024
+
+
+class _UploadHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        self.send_header("Tus-Resumable", "1.0.0")
+        for (name, value) in (headers or {}).iteritems():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _upload(self):
+        return self.server.uploads.get(self.path.rstrip("/").split("/")[-1])
+
+    def do_POST(self):
+        size = int(self.headers.getheader("Upload-Length", -1))
+        if size < 0:
+            return self._reply(400)
+        metadata = {}
+        for item in (self.headers.getheader("Upload-Metadata") or "").split(","):
+            if item.strip():
+                (key, value) = item.strip().split(" ", 1)
+                metadata[key] = base64.b64decode(value)
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self.server.storage, upload_id)
+        open(path, "wb").close()
+        self.server.uploads[upload_id] = {"path": path, "size": size, "offset": 0, "metadata": metadata}
+        self._reply(201, {"Location": "/files/%s" % upload_id})
+
+    def do_HEAD(self):
+        upload = self._upload()
+        if not upload:
+            return self._reply(404)
+        self._reply(200, {"Upload-Offset": str(upload["offset"]), "Upload-Length": str(upload["size"])})
+
+    def do_PATCH(self):
+        upload = self._upload()
+        if not upload:
+            return self._reply(404)
+        if int(self.headers.getheader("Upload-Offset", -1)) != upload["offset"]:
+            return self._reply(409)
+        length = int(self.headers.getheader("Content-Length", 0))
+        self.server.requests += 1
+        # Keep part of the chunk and drop the connection, like a flaky link.
+        drop = self.server.drop_every and self.server.requests % self.server.drop_every == 0
+        keep = length / 2 if drop else length
+        with open(upload["path"], "r+b") as upload_file:
+            upload_file.seek(upload["offset"])
+            received = 0
+            while received < keep:
+                block = self.rfile.read(min(_BLOCK_SIZE, keep - received))
+                if not block:
+                    break
+                upload_file.write(block)
+                received += len(block)
+                if self.server.max_rate:
+                    time.sleep(len(block) / float(self.server.max_rate))
+        upload["offset"] += received
+        self.server.received += received
+        if drop or received < length:
+            self.server.dropped += 1
+            self.close_connection = 1
+            self.connection.close()
+            return
+        self._reply(204, {"Upload-Offset": str(upload["offset"])})
+
+
+class StandInUploadServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded tus upload server, storing uploads in a directory.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, storage=None, drop_every=0, max_rate=0, verbose=False):
+        """
+        :param port: Port to listen on, 0 to pick a free one
+        :param storage: Directory to write uploads to, a temporary one if None
+        :param drop_every: Drop the connection half way through every n-th
+                           chunk, 0 to never drop
+        :param max_rate: Rate the server receives at in bytes per second, 0
+                         for no cap
+        :param verbose: True to log every request
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", port), _UploadHandler)
+        self.storage = storage or tempfile.mkdtemp()
+        self.drop_every = drop_every
+        self.max_rate = max_rate
+        self.verbose = verbose
+        self.uploads = {}
+        self.requests = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/files/" % self.server_address[1]
+
+    def start(self):
+        """
+        Serve requests from a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--port", type="int", default=8080, help="Port to listen on")
+    parser.add_option("--storage", help="Directory to write uploads to")
+    parser.add_option("--drop-every", type="int", default=0,
+                      help="Drop the connection half way through every n-th chunk")
+    parser.add_option("--max-rate", type="int", default=0,
+                      help="Receive rate cap in bytes per second")
+    (options, args) = parser.parse_args()
+    if options.storage and not os.path.isdir(options.storage):
+        os.makedirs(options.storage)
+    server = StandInUploadServer(options.port, options.storage, options.drop_every,
+                                 options.max_rate, verbose=True)
+    print("Serving uploads at %s, stored in %s" % (server.url, server.storage))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
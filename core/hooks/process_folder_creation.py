@@ -0,0 +1,147 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+I/O Hook which creates all folders on disk.
+
+Does what the core hook does, with open permissions, but with far fewer
+round-trips to the storage when a call brings many folders, ie. when folders
+are created for many Shots at once (see scripts/bulk_folders.py): each parent
+folder is listed once to find what already exists, instead of checking every
+item on its own, and the missing items are created in parallel, one level of
+the tree at a time so parents exist before their content. The listings of a
+level are done in parallel as well.
+"""
+
+import errno
+import os
+import shutil
+import sys
+from multiprocessing.pool import ThreadPool
+
+from tank import Hook
+
+# Number of folders listed or items created at the same time.
+IO_THREADS = 16
+
+# Calls with fewer items than this are processed in the calling thread.
+_PARALLEL_MIN_ITEMS = 32
+
+
+def _item_path(item):
+    if item.get("action") == "copy":
+        return item.get("target_path")
+    return item.get("path")
+
+
+def _depth(path):
+    return path.rstrip(os.sep).count(os.sep)
+
+
+def _listdir(path):
+    try:
+        return set(os.listdir(path))
+    except OSError, e:
+        if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+            raise
+        return set()
+
+
+def _create(item):
+    action = item.get("action")
+    path = _item_path(item)
+    try:
+        if action in ("entity_folder", "folder"):
+            # create the folder using open permissions
+            os.makedirs(path, 0777)
+        elif action == "symlink":
+            os.symlink(item.get("target"), path)
+        elif action == "copy":
+            # do a standard file copy
+            shutil.copy(item.get("source_path"), path)
+            # set permissions to open
+            os.chmod(path, 0666)
+        elif action == "create_file":
+            parent_folder = os.path.dirname(path)
+            if not os.path.exists(parent_folder):
+                os.makedirs(parent_folder, 0777)
+            # create the file
+            with open(path, "wb") as fp:
+                fp.write(item.get("content"))
+            # and set permissions to open
+            os.chmod(path, 0666)
+    except OSError, e:
+        # Created by someone else since its parent was listed, left as is.
+        if e.errno != errno.EEXIST:
+            raise
+
+
+class ProcessFolderCreation(Hook):
+
+    def execute(self, items, preview_mode, **kwargs):
+        """
+        Create the files, folders and symlinks of a folder creation request,
+        with open permissions.
+
+        :param items: List of item dictionaries, each with an 'action' of
+                      'folder', 'entity_folder', 'remote_entity_folder',
+                      'copy', 'create_file' or 'symlink', see the core hook
+        :param preview_mode: True to only list what would be created
+        :returns list: Paths of the files, folders and symlinks created
+        """
+        # The items each level of the tree holds, in the order Toolkit gave
+        # them, parents coming before their content.
+        levels = {}
+        for item in items:
+            action = item.get("action")
+            if action == "remote_entity_folder":
+                # Created by another file system setup, nothing to do here.
+                continue
+            if action not in ("entity_folder", "folder", "symlink", "copy", "create_file"):
+                raise Exception("Unknown folder hook action '%s'" % action)
+            if action == "symlink" and sys.platform == "win32":
+                # no windows support
+                continue
+            path = _item_path(item)
+            levels.setdefault(_depth(path), []).append(item)
+
+        # set the umask so that we get true permissions
+        old_umask = os.umask(0)
+        pool = ThreadPool(IO_THREADS) if len(items) >= _PARALLEL_MIN_ITEMS else None
+        map_fn = pool.map if pool else map
+        locations = []
+        new_paths = set()
+        try:
+            for depth in sorted(levels):
+                level = levels[depth]
+                # Content of a folder about to be created doesn't exist yet.
+                parents = sorted(set(os.path.dirname(_item_path(i)) for i in level))
+                to_list = [p for p in parents if p not in new_paths]
+                listings = dict(zip(to_list, map_fn(_listdir, to_list)))
+
+                missing = []
+                for item in level:
+                    path = _item_path(item)
+                    (parent, name) = os.path.split(path)
+                    if name in listings.get(parent, ()) or path in new_paths:
+                        continue
+                    missing.append(item)
+                    new_paths.add(path)
+                    locations.append(path)
+                if not preview_mode:
+                    map_fn(_create, missing)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+            # do the umask reset
+            os.umask(old_umask)
+
+        return locations
@@ -15,12 +15,18 @@ This hook is executed prior to application launch and is useful if you need
 to set environment variables or run scripts as part of the app initialization.
 """
 
+import imp
 import os
 import sys
 import tank
 import pprint
 import subprocess
-import pickle
+
+# Shared launch helpers, loaded once under their own name, see
+# before_nuke_launch.py.
+launch_environment = sys.modules.get("tk_config_launch_environment") or imp.load_source(
+    "tk_config_launch_environment",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "launch_environment.py"))
 
 class BeforeNukeLaunch(tank.Hook):
     """
@@ -57,26 +63,25 @@ class BeforeNukeLaunch(tank.Hook):
 
         home_path = os.path.expanduser("~")
         profile_path = "%s/.profile_jaunt" % home_path
-        cmd = 'source %s' % profile_path
-        dump = '/usr/bin/python -c "import os,pickle; print pickle.dumps(os.environ)"'
 
+        # The profile's environment is cached, and only sourced again once the
+        # profile, a file it sources or the Nuke version changes.
+        # do not pass the DISPLAY! 
         try:
-            penv = os.popen('%s && %s' % (cmd,dump))
+            launch_environment.apply_profile_environment(
+                profile_path, version, multi_launchapp.cache_location,
+                multi_launchapp.log_debug, exclude=["DISPLAY"])
         except OSError as e:
             multi_launchapp.log_info("Could not create environment context!")
             multi_launchapp.log_info("OSError %s" % e.errno)  
             multi_launchapp.log_info("OSError %s" % e.filename)
+            raise
         except:
-            multi_launchapp.log_info("Could not create environment context!" + sys.exc_info()[0])
-            
-        env = pickle.loads(penv.read())
-        env["NUKE_PATH"] = env["NUKE_PATH"] + ":" + env["NUKE_PLUGIN_PATH"] + ":" + env["NUKE_PATH_10_0"]
-        os.environ = env
+            multi_launchapp.log_info("Could not create environment context! %s" % sys.exc_info()[0])
+            raise
 
-        # do not pass the DISPLAY! 
-        env_exclude = ["DISPLAY"]
-        
-        for key, var in os.environ.iteritems():
-            if not key in env_exclude:
-                tank.util.append_path_to_env_var(key, var)
+        # Merge the Nuke 10.0 plugin paths into NUKE_PATH, then deduplicate
+        # the search paths and drop the ones that don't exist.
+        launch_environment.compose_search_paths(
+            launch_environment.NUKE_PATH_MERGES["10.0"], multi_launchapp.log_debug)
                     
@@ -15,12 +15,18 @@ This hook is executed prior to application launch and is useful if you need
 to set environment variables or run scripts as part of the app initialization.
 """
 
+import imp
+import json
 import os
 import sys
 import tank
+import time
 
-import shutil
-from distutils.dir_util import copy_tree
+# Extension install helpers live next to this hook. They're loaded under a
+# name of their own so they can't clash with the launcher's modules.
+extension_install = sys.modules.get("tk_config_extension_install") or imp.load_source(
+    "tk_config_extension_install",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "extension_install.py"))
 
 
 class BeforePremiereLaunch(tank.Hook):
@@ -62,29 +68,34 @@ class BeforePremiereLaunch(tank.Hook):
                 # if not os.path.exists(install_path):
                 #     os.symlink(extensions[extension], install_path)
                 try:
-                    if os.path.exists(install_path):
-                        multi_launchapp.log_info("Attempting to remove %s..." % install_path)
-                        if os.path.islink(install_path):
-                            os.unlink(install_path)
-                        else:
-                            shutil.rmtree(install_path)
-                    source_path = os.path.join(extensions[extension], extension_version)
-                    if not os.path.exists(source_path):
-                        multi_launchapp.log_info("Source path %s does NOT exist!" % source_path)
-                        multi_launchapp.log_info("Unable to copy and launch Premiere with extension")
-                        return
-                    multi_launchapp.log_info("Attempting to copy %s to %s..." % (source_path, install_path))
-                    os.system('cp -r "%s" "%s"' % (source_path, install_path))
-                    # copy_tree(source_path, install_path)
+                    if extension_install.is_current(install_path, extension_version):
+                        multi_launchapp.log_info("%s %s is already installed" % (extension, extension_version))
+                    else:
+                        source_path = os.path.join(extensions[extension], extension_version)
+                        if not os.path.exists(source_path):
+                            multi_launchapp.log_info("Source path %s does NOT exist!" % source_path)
+                            multi_launchapp.log_info("Unable to copy and launch Premiere with extension")
+                            return
+                        # Only the files which changed are copied over, and the
+                        # install is swapped in once complete.
+                        multi_launchapp.log_info("Attempting to sync %s to %s..." % (source_path, install_path))
+                        extension_install.sync_extension(
+                            source_path, install_path, extension_version,
+                            log=multi_launchapp.log_info)
                     # Update the panel shotgun projects and render profiles lists
-                    multi_launchapp.log_info("Attempting to refresh panel index %s..." % install_path)
-                    refresh_panel = "%s/bash/make_index.sh" % install_path
-                    refresh_panel = refresh_panel.replace(" ", "\ ")
-                    sg = multi_launchapp.shotgun
-                    project = sg.find_one("Project", [["id", "is", multi_launchapp.context.project["id"]]], ["tank_name"])
-                    cmd = "%s %s" % (refresh_panel, project["tank_name"])
-                    multi_launchapp.log_info(cmd)
-                    os.system(cmd)
+                    # in the background, Premiere starts with the last index built
+                    # meanwhile.
+                    max_age = 3600 * multi_launchapp.get_setting("panel_index_max_age_hours", 12)
+                    project_name = self._project_tank_name(multi_launchapp.context.project["id"], max_age)
+                    if extension_install.panel_index_is_stale(
+                            install_path, extension_version, project_name, max_age):
+                        multi_launchapp.log_info("Refreshing panel index %s in the background..." % install_path)
+                        extension_install.refresh_panel_index(
+                            install_path, extension_version, project_name,
+                            os.path.join(multi_launchapp.cache_location, "panel_index_%s.log" % extension),
+                            multi_launchapp.log_info)
+                    else:
+                        multi_launchapp.log_info("Panel index %s is up to date" % install_path)
                 except Exception, e:
                     multi_launchapp.log_info(e)
                     raise
@@ -103,3 +114,35 @@ class BeforePremiereLaunch(tank.Hook):
         # > multi_launchapp = self.parent
         # > if multi_launchapp.get_setting("engine") == "tk-nuke":
         #       do_something()
+
+    def _project_tank_name(self, project_id, max_age):
+        """
+        Return the tank_name of a project, cached locally and looked up in
+        Shotgun again once the cached one is older than max_age, like the
+        panel index built from it.
+
+        :param project_id: Id of the project
+        :param max_age: Age in seconds past which the tank_name is looked up again
+        :returns: The tank_name of the project
+        """
+        multi_launchapp = self.parent
+        cache_path = os.path.join(multi_launchapp.cache_location, "project_tank_names.json")
+        try:
+            with open(cache_path) as cache_file:
+                tank_names = json.load(cache_file)
+        except (IOError, ValueError):
+            tank_names = {}
+        cached = tank_names.get(str(project_id))
+        if isinstance(cached, dict) and time.time() - cached.get("time", 0) <= max_age:
+            return str(cached["tank_name"])
+
+        sg = multi_launchapp.shotgun
+        project = sg.find_one("Project", [["id", "is", project_id]], ["tank_name"])
+        tank_names[str(project_id)] = {"tank_name": project["tank_name"], "time": time.time()}
+        if not os.path.isdir(multi_launchapp.cache_location):
+            os.makedirs(multi_launchapp.cache_location)
+        temp_path = "%s.%d" % (cache_path, os.getpid())
+        with open(temp_path, "w") as cache_file:
+            json.dump(tank_names, cache_file)
+        os.rename(temp_path, cache_path)
+        return project["tank_name"]
@@ -0,0 +1,372 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Incremental installer for the extensions copied locally by the before app
+launch hooks.
+
+The source of an extension usually lives on a mounted network share, so
+copying it over on every launch is slow. Instead, a manifest of the file
+sizes, modification times and hashes of the source is compared with the one
+recorded for the local install, and only the files which changed are copied,
+in parallel. The new install is assembled next to the current one, hard
+linking the files which didn't change, and renamed into place once complete.
+
+A stamp recording the installed version and its manifest is written in the
+install, so the whole step is skipped when the install is already current.
+
+The panel index of an install is rebuilt in the background, and only once it
+is older than a given age or the installed version changed, so the
+application can start right away with the last index built. It is built in a
+copy of the install, and the files written are moved into the install once
+complete. The index files are carried over to the new install when syncing,
+and a lock next to the install keeps a sync from swapping the install while
+the index files are moved in.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+# Name of the stamp written at the root of an install.
+STAMP_NAME = ".extension_install.json"
+
+# Number of files copied at the same time.
+COPY_THREADS = 8
+
+# Size of the blocks files are read in when hashing them.
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """
+    Compute the sha1 hex digest of a file, reading it in blocks.
+
+    :param path: Path to the file
+    :returns string: Hex digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), ""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_manifest(root):
+    """
+    Build the manifest of the files under a directory. Hashes are left empty,
+    they are only computed for the files whose size matches but whose
+    modification time doesn't.
+
+    :param root: Directory to build the manifest for
+    :returns dict: Relative path -> [size, mtime, hash or None]
+    """
+    manifest = {}
+    for (dirpath, dirnames, filenames) in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(path, root)
+            if relative_path == STAMP_NAME or os.path.islink(path):
+                continue
+            stat = os.stat(path)
+            manifest[relative_path] = [stat.st_size, stat.st_mtime, None]
+    return manifest
+
+
+def read_stamp(install_path):
+    """
+    Read the stamp of an install.
+
+    :param install_path: Path to the local install
+    :returns: The stamp dictionary, or None if the install has no valid stamp
+    """
+    try:
+        with open(os.path.join(install_path, STAMP_NAME)) as stamp_file:
+            return json.load(stamp_file)
+    except (IOError, ValueError):
+        return None
+
+
+def is_current(install_path, version):
+    """
+    Check if an install is stamped with the given version.
+
+    :param install_path: Path to the local install
+    :param version: Version of the extension to install
+    :returns bool: True if the install is current
+    """
+    if os.path.islink(install_path):
+        return False
+    stamp = read_stamp(install_path)
+    return bool(stamp) and stamp.get("version") == version
+
+
+def _unchanged(source_path, install_path, source_entry, installed_entry):
+    # A file is unchanged if the install still holds what the source had
+    # when it was last installed, ie. same size and either the same mtime
+    # or the same content.
+    (size, mtime, digest) = source_entry
+    if installed_entry is None or installed_entry[0] != size:
+        return False
+    if not os.path.isfile(install_path) or os.path.getsize(install_path) != size:
+        return False
+    if installed_entry[1] == mtime:
+        source_entry[2] = installed_entry[2]
+        return True
+    installed_digest = installed_entry[2] or file_hash(install_path)
+    source_entry[2] = file_hash(source_path)
+    return installed_digest == source_entry[2]
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _link_or_copy(source, destination):
+    _makedirs(os.path.dirname(destination))
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _copy(job):
+    (source, destination) = job
+    _makedirs(os.path.dirname(destination))
+    shutil.copy2(source, destination)
+
+
+def _remove(path):
+    if os.path.islink(path) or os.path.isfile(path):
+        os.unlink(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def _lock_install(install_path):
+    # Blocks until no other sync or panel index rebuild holds the lock of
+    # the install, returns the open lock file.
+    _makedirs(os.path.dirname(os.path.abspath(install_path)))
+    lock_file = open("%s.lock" % install_path, "a")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def _unlock(lock_file):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
+def sync_extension(source_path, install_path, version, threads=COPY_THREADS, log=None):
+    """
+    Bring a local install in line with the source of an extension.
+
+    The files which didn't change since the last install are hard linked, or
+    copied if linking fails, into a staging directory next to the install,
+    the changed ones are copied from the source in parallel. The staging
+    directory is then stamped and renamed into place, so an interrupted sync
+    never leaves a partial install behind. Files of the install which aren't
+    in the source, like the generated panel index, are carried over so the
+    application keeps the last index built until it is rebuilt.
+
+    :param source_path: Path to the version of the extension to install
+    :param install_path: Path to the local install
+    :param version: Version of the extension being installed
+    :param threads: Number of files to copy at the same time
+    :param log: Optional callable to log progress messages with
+    :returns: (copied, kept) tuple, number of files copied from the source and
+              number of files kept from the current install
+    """
+    log = log or (lambda msg: None)
+    lock_file = _lock_install(install_path)
+    try:
+        return _sync_extension(source_path, install_path, version, threads, log)
+    finally:
+        _unlock(lock_file)
+
+
+def _sync_extension(source_path, install_path, version, threads, log):
+    source_manifest = build_manifest(source_path)
+    if os.path.islink(install_path):
+        os.unlink(install_path)
+    installed = read_stamp(install_path) if os.path.isdir(install_path) else None
+    installed_manifest = (installed or {}).get("manifest") or {}
+
+    staging_path = "%s.staging.%d" % (install_path, os.getpid())
+    _remove(staging_path)
+    os.makedirs(staging_path)
+    try:
+        copies = []
+        kept = 0
+        for (relative_path, entry) in sorted(source_manifest.iteritems()):
+            source_file = os.path.join(source_path, relative_path)
+            installed_file = os.path.join(install_path, relative_path)
+            staged_file = os.path.join(staging_path, relative_path)
+            if _unchanged(source_file, installed_file, entry, installed_manifest.get(relative_path)):
+                _link_or_copy(installed_file, staged_file)
+                kept += 1
+            else:
+                copies.append((source_file, staged_file))
+        # Files neither installed from the source before nor now were
+        # generated in the install.
+        if installed is not None:
+            for relative_path in build_manifest(install_path):
+                if relative_path not in source_manifest and relative_path not in installed_manifest:
+                    _link_or_copy(os.path.join(install_path, relative_path),
+                                  os.path.join(staging_path, relative_path))
+
+        if copies:
+            log("Copying %d changed files from %s..." % (len(copies), source_path))
+            pool = ThreadPool(max(1, min(threads, len(copies))))
+            try:
+                pool.map(_copy, copies)
+            finally:
+                pool.close()
+                pool.join()
+        # Files copied from the source carry its mtime, so their entry is
+        # already right, but hashes are only known for the files compared.
+        stamp = {"version": version, "source": source_path, "manifest": source_manifest}
+        with open(os.path.join(staging_path, STAMP_NAME), "w") as stamp_file:
+            json.dump(stamp, stamp_file)
+
+        # Swap the staged install in, the previous one is only removed once
+        # the new one is in place.
+        previous_path = None
+        if os.path.exists(install_path):
+            previous_path = "%s.previous.%d" % (install_path, os.getpid())
+            _remove(previous_path)
+            os.rename(install_path, previous_path)
+        os.rename(staging_path, install_path)
+        if previous_path:
+            shutil.rmtree(previous_path, ignore_errors=True)
+    except:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+
+    log("Installed %s: %d files copied, %d unchanged" % (version, len(copies), kept))
+    return (len(copies), kept)
+
+
+# Name of the stamp written at the root of an install once its panel index
+# was rebuilt. It records the version, so a new version always gets its index
+# rebuilt.
+INDEX_STAMP_NAME = ".panel_index.json"
+
+# Installs whose panel index is being rebuilt by this process.
+_index_refreshes = set()
+_index_refreshes_lock = threading.Lock()
+
+
+def panel_index_is_stale(install_path, version, project_name, max_age):
+    """
+    Check if the panel index of an install needs to be rebuilt, ie. if it
+    was never built for this version and project, or was built more than
+    max_age seconds ago.
+
+    :param install_path: Path to the local install
+    :param version: Version of the installed extension
+    :param project_name: Name of the project the index is built for
+    :param max_age: Age in seconds past which the index is rebuilt
+    :returns bool: True if the index should be rebuilt
+    """
+    try:
+        with open(os.path.join(install_path, INDEX_STAMP_NAME)) as stamp_file:
+            stamp = json.load(stamp_file)
+    except (IOError, ValueError):
+        return True
+    return (stamp.get("version") != version or stamp.get("project") != project_name
+            or time.time() - stamp.get("time", 0) > max_age)
+
+
+def _refresh_panel_index(install_path, version, project_name, log_path, log):
+    # The index is built in a copy of the install, without holding its lock,
+    # so a sync on the next launch never waits for the script. Only the files
+    # the script wrote are then moved into the install, under the lock.
+    build_path = "%s.index.%d" % (install_path, os.getpid())
+    try:
+        started = time.time()
+        _remove(build_path)
+        shutil.copytree(install_path, build_path, symlinks=True)
+        before = build_manifest(build_path)
+        with open(log_path, "a") as log_file:
+            returncode = subprocess.call(
+                [os.path.join(os.path.abspath(build_path), "bash", "make_index.sh"), project_name],
+                cwd=build_path, stdout=log_file, stderr=subprocess.STDOUT, close_fds=True)
+        if returncode:
+            log("Panel index refresh failed with code %d, see %s" % (returncode, log_path))
+            return
+        written = [relative_path for (relative_path, entry) in build_manifest(build_path).iteritems()
+                   if (before.get(relative_path) or [None, None])[:2] != entry[:2]]
+
+        lock_file = _lock_install(install_path)
+        try:
+            # A sync swapped a new version in meanwhile, which needs its own
+            # index.
+            if not is_current(install_path, version):
+                log("Panel index of %s dropped, the install changed while it was built" % install_path)
+                return
+            for relative_path in written:
+                destination = os.path.join(install_path, relative_path)
+                _makedirs(os.path.dirname(destination))
+                os.rename(os.path.join(build_path, relative_path), destination)
+            stamp = {"version": version, "project": project_name, "time": started}
+            stamp_path = os.path.join(install_path, INDEX_STAMP_NAME)
+            temp_path = "%s.%d" % (stamp_path, os.getpid())
+            with open(temp_path, "w") as stamp_file:
+                json.dump(stamp, stamp_file)
+            os.rename(temp_path, stamp_path)
+        finally:
+            _unlock(lock_file)
+        log("Panel index of %s refreshed in %.1fs" % (install_path, time.time() - started))
+    except Exception, e:
+        log("Panel index refresh failed: %s" % e)
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+        with _index_refreshes_lock:
+            _index_refreshes.discard(install_path)
+
+
+def refresh_panel_index(install_path, version, project_name, log_path, log=None):
+    """
+    Rebuild the panel index of an install in the background, by running its
+    bash/make_index.sh script for the project. The index is only stamped as
+    current once the script succeeded, a failed rebuild is retried on the
+    next launch.
+
+    :param install_path: Path to the local install
+    :param version: Version of the installed extension
+    :param project_name: Name of the project the index is built for
+    :param log_path: Path to the file the script output is appended to
+    :param log: Optional callable to log progress messages with
+    :returns: The thread running the script, or None if the index of this
+              install is already being rebuilt
+    """
+    log = log or (lambda msg: None)
+    with _index_refreshes_lock:
+        if install_path in _index_refreshes:
+            return None
+        _index_refreshes.add(install_path)
+    thread = threading.Thread(
+        target=_refresh_panel_index,
+        args=(install_path, version, project_name, log_path, log),
+        name="panel_index_refresh")
+    thread.start()
+    return thread
@@ -0,0 +1,256 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Launch environment helpers shared by the before app launch hooks.
+
+Sourcing the studio profile means spawning a shell and a python interpreter,
+so the changes the profile makes to the environment are cached and applied
+directly on later launches, until the profile, any file it sources or the
+application version changes.
+
+The search path variables are then composed from the profile's environment:
+extra paths are merged in per Nuke release, and every search path list is
+deduplicated and pruned of entries that don't exist, so the application
+doesn't have to look through them at startup.
+
+Both write to os.environ of the launcher, which lives on between launches.
+The values they set are recorded and put back to what they were before at
+the start of the next launch, so each launch starts from the launcher's own
+environment rather than the one composed for the previous application.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+
+# Matches 'source <file>' and '. <file>' lines of a shell script.
+_SOURCE_LINE = re.compile(r"^\s*(?:source|\.)\s+([^\s;&|]+)", re.MULTILINE)
+
+# Deepest level of nested sourced files looked at.
+_MAX_SOURCE_DEPTH = 8
+
+# Variables holding lists of search paths. Any other variable is left as is.
+SEARCH_PATH_VARIABLES = [
+    "PATH",
+    "PYTHONPATH",
+    "LD_LIBRARY_PATH",
+    "DYLD_LIBRARY_PATH",
+    "DYLD_FRAMEWORK_PATH",
+    "NUKE_PATH",
+    "OFX_PLUGIN_PATH",
+]
+
+# Nuke release -> search path variable -> variables whose paths are appended
+# to it.
+NUKE_PATH_MERGES = {
+    None: {},
+    "10.0": {"NUKE_PATH": ["NUKE_PLUGIN_PATH", "NUKE_PATH_10_0"]},
+    "10.5": {"NUKE_PATH": ["NUKE_PLUGIN_PATH", "NUKE_PATH_10_5"]},
+}
+
+
+# Variables set by the helpers, name -> (value before the launch, value set),
+# None standing for a variable that isn't set. Kept here, as this module is
+# imported once per launcher process.
+_launch_changes = {}
+
+
+def _set_env(name, value):
+    name = _to_str(name)
+    before = _launch_changes[name][0] if name in _launch_changes else os.environ.get(name)
+    if value is None:
+        os.environ.pop(name, None)
+    else:
+        os.environ[name] = _to_str(value)
+    _launch_changes[name] = (before, os.environ.get(name))
+
+
+def restore_launch_environment():
+    """
+    Put the variables set for the previous launch back to their values from
+    before it, leaving alone the ones changed since by something else.
+    """
+    for (name, (before, after)) in _launch_changes.items():
+        if os.environ.get(name) == after:
+            if before is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = before
+    _launch_changes.clear()
+
+
+def _to_str(value):
+    # Values loaded from the JSON cache are unicode, os.environ wants str.
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def profile_files(profile_path, depth=0):
+    """
+    Find the profile and every file it sources, recursively.
+
+    :param profile_path: Path to the profile shell script
+    :returns list: Paths of the profile and the existing files it sources
+    """
+    if depth > _MAX_SOURCE_DEPTH or not os.path.isfile(profile_path):
+        return []
+    files = [profile_path]
+    with open(profile_path) as profile_file:
+        content = profile_file.read()
+    for match in _SOURCE_LINE.finditer(content):
+        sourced_path = os.path.expanduser(os.path.expandvars(match.group(1).strip("'\"")))
+        if sourced_path not in files:
+            files.extend(f for f in profile_files(sourced_path, depth + 1) if f not in files)
+    return files
+
+
+def profile_cache_key(profile_path, version):
+    """
+    Build the key the sourced environment is cached under, from the content
+    and modification time of the profile and every file it sources, and the
+    application version.
+
+    :param profile_path: Path to the profile shell script
+    :param version: Version of the application being launched
+    :returns string: Hex digest of the cache key
+    """
+    key = hashlib.sha1(str(version))
+    for path in profile_files(profile_path):
+        with open(path, "rb") as source_file:
+            content = source_file.read()
+        key.update("%s\0%s\0%s" % (path, os.path.getmtime(path), hashlib.sha1(content).hexdigest()))
+    return key.hexdigest()
+
+
+def source_profile(profile_path):
+    """
+    Source the profile in a shell and return the resulting environment.
+
+    :param profile_path: Path to the profile shell script
+    :returns: Environment mapping of the shell after sourcing the profile
+    """
+    cmd = 'source %s' % profile_path
+    dump = '/usr/bin/python -c "import os,pickle; print pickle.dumps(os.environ)"'
+    penv = os.popen('%s && %s' % (cmd, dump))
+    return pickle.loads(penv.read())
+
+
+def _inputs_match(cached, exclude):
+    for (name, value) in cached["inputs"].iteritems():
+        if name not in exclude and os.environ.get(_to_str(name)) != value:
+            return False
+    return True
+
+
+def apply_profile_environment(profile_path, version, cache_dir, log=None, exclude=()):
+    """
+    Apply the environment set up by sourcing the profile to os.environ.
+
+    The changes made for an earlier launch from the same process are undone
+    first. Only the changes the profile makes are cached, along with the
+    values the changed variables had before it was sourced. The cached
+    changes are used as long as the cache key still matches and each of
+    those variables still has its value from before the profile was sourced.
+    Otherwise the profile is sourced again.
+
+    :param profile_path: Path to the profile shell script
+    :param version: Version of the application being launched
+    :param cache_dir: Directory to keep the cached environment in
+    :param log: Optional callable to log progress messages with
+    :param exclude: Names of the variables the profile's values are not
+                    applied for, ie. DISPLAY
+    :returns: os.environ, updated with the profile's environment
+    """
+    log = log or (lambda msg: None)
+    restore_launch_environment()
+    cache_path = os.path.join(cache_dir, "profile_environment_%s.json" %
+                              re.sub(r"[^\w.-]", "_", str(version)))
+    key = profile_cache_key(profile_path, version)
+
+    cached = None
+    if os.path.isfile(cache_path):
+        try:
+            with open(cache_path) as cache_file:
+                cached = json.load(cache_file)
+        except (IOError, ValueError):
+            cached = None
+    if cached and cached["key"] == key and _inputs_match(cached, exclude):
+        log("Using cached environment for %s" % profile_path)
+    else:
+        log("Sourcing %s" % profile_path)
+        base_env = dict(os.environ)
+        sourced_env = dict(source_profile(profile_path))
+        changed = dict((name, value) for (name, value) in sourced_env.iteritems()
+                       if base_env.get(name) != value)
+        removed = [name for name in base_env if name not in sourced_env]
+        cached = {
+            "key": key,
+            "inputs": dict((name, base_env.get(name)) for name in changed.keys() + removed),
+            "changed": changed,
+            "removed": removed,
+        }
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        temp_path = "%s.%d" % (cache_path, os.getpid())
+        with open(temp_path, "w") as cache_file:
+            json.dump(cached, cache_file)
+        os.rename(temp_path, cache_path)
+
+    for (name, value) in cached["changed"].iteritems():
+        if name not in exclude:
+            _set_env(name, value)
+    for name in cached["removed"]:
+        if name not in exclude:
+            _set_env(name, None)
+    return os.environ
+
+
+def compose_search_paths(merges=None, log=None):
+    """
+    Compose the search path variables in os.environ. The paths of the
+    variables to merge are appended first, then each search path list is
+    deduplicated, keeping the first occurrence of each path, and paths that
+    don't exist are dropped.
+
+    :param merges: Optional dictionary of search path variable -> list of
+                   variables whose paths are appended to it, ie. an entry of
+                   NUKE_PATH_MERGES
+    :param log: Optional callable to log progress messages with
+    :returns dict: (entries before, entries after) tuples keyed by variable,
+                   for each search path variable that is set
+    """
+    log = log or (lambda msg: None)
+    merges = merges or {}
+    stats = {}
+    for name in SEARCH_PATH_VARIABLES + [n for n in merges if n not in SEARCH_PATH_VARIABLES]:
+        values = [os.environ.get(name)] + [os.environ.get(m) for m in merges.get(name, [])]
+        if not any(values):
+            continue
+        paths = []
+        for value in values:
+            paths.extend(value.split(os.pathsep) if value else [])
+
+        composed = []
+        for path in paths:
+            if path and path not in composed and os.path.exists(os.path.expanduser(path)):
+                composed.append(path)
+        _set_env(name, os.pathsep.join(composed))
+        stats[name] = (len(paths), len(composed))
+
+    before = sum(b for (b, a) in stats.values())
+    after = sum(a for (b, a) in stats.values())
+    for (name, (b, a)) in sorted(stats.items()):
+        log("%s: %d -> %d entries" % (name, b, a))
+    log("Search paths shortened from %d to %d entries" % (before, after))
+    return stats
@@ -1,19 +1,36 @@
 # Copyright (c) 2015 Shotgun Software Inc.
-# 
+#
 # CONFIDENTIAL AND PROPRIETARY
-# 
-# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit 
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
 # Source Code License included in this distribution package. See LICENSE.
-# By accessing, using, copying or modifying this work you indicate your 
-# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import imp
+import os
+import sys
+
 import sgtk
 from sgtk import Hook
 
+# Shared upload helpers live next to this hook. They're loaded under a name of
+# their own so they can't clash with Nuke's modules.
+quickdaily_upload_queue = sys.modules.get("tk_config_quickdaily_upload_queue") or imp.load_source(
+    "tk_config_quickdaily_upload_queue",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "quickdaily_upload_queue.py"))
+
 class NukeQuickdailiesUploadMovie(Hook):
     """
     Hook that is used to upload quicktime to Shotgun for use in Screening Room.
+
+    Uploads are put on a disk backed queue and sent by a background worker
+    process, so Nuke doesn't wait on the transfer and uploads carry on after
+    it exits, under the upload_max_rate_mbps cap. Movies are uploaded straight
+    to Shotgun, a failed upload being retried from the start. Only when an
+    upload_url is configured are movies sent in resumable chunks to that
+    upload server. A movie already uploaded to the Version isn't sent again.
     """
 
     def execute(self, mov_path, version_id, comments, **kwargs):
@@ -27,9 +44,26 @@ class NukeQuickdailiesUploadMovie(Hook):
         :returns:            None
         """
         app = self.parent
-        app.log_debug("Uploading movie %s to Shotgun Version %s..." % (mov_path, version_id))
+        queue_dir = os.path.join(app.cache_location, "upload_queue")
         try:
-            result = app.shotgun.upload('Version', version_id, mov_path, 'sg_uploaded_movie')
+            job = quickdaily_upload_queue.enqueue(
+                queue_dir, "Version", version_id, mov_path, "sg_uploaded_movie",
+                max_attempts=app.get_setting("upload_attempts", 5),
+                retry_delay=app.get_setting("upload_retry_delay", 30),
+                upload_url=app.get_setting("upload_url"),
+                chunk_size=int(app.get_setting("upload_chunk_size_mb", 8) * 1024 * 1024))
+            # The cap is given in megabits per second.
+            quickdaily_upload_queue.start_worker(
+                queue_dir, app.get_setting("upload_concurrency", 2),
+                int(app.get_setting("upload_max_rate_mbps", 0) * 125000),
+                app.get_setting("upload_dedup", True))
         except Exception, e:
-            app.log_warning("Unable to upload movie to Shotgun: %s" % e)
+            app.log_warning("Unable to queue movie upload to Shotgun: %s" % e)
+            return
 
+        status = quickdaily_upload_queue.queue_status(queue_dir)
+        app.log_info("Queued upload of %s to Shotgun Version %s, %d uploads pending. "
+                     "Check the queue with: python %s status %s" % (
+                         mov_path, version_id, status["queued"] + status["uploading"],
+                         quickdaily_upload_queue.__file__.replace(".pyc", ".py"), queue_dir))
+        app.log_debug("Upload job %s" % job["id"])
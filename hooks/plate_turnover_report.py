@@ -9,9 +9,29 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 # Standard Imports
-import math
+import collections
+import glob
+import hashlib
+import itertools
+import json
+import multiprocessing
 import os
+import Queue
+import shutil
+import sys
+import threading
+import time
+import urlparse
+import zipfile
 from datetime import date, datetime
+from multiprocessing.pool import ThreadPool
+
+# PIL is only used to downsample thumbnails. They're used at full size if
+# it isn't available.
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
 
 # Report Lab Imports
 from reportlab.lib.units import inch, mm
@@ -21,33 +41,493 @@ from reportlab.lib.styles import ParagraphStyle
 from reportlab.platypus import Table, Paragraph, Image, Frame
 from reportlab.platypus import TableStyle, FrameBreak, Spacer, KeepInFrame
 
+import tank
 from tank import Hook
 
 # pull in utilities for hooks
-from utilities.utilities import retrieve_thumbnails, find_entities_by_ids, safe_para
+from utilities.utilities import find_entities_by_ids, safe_para
 from utilities.utilities import to_safe_file_name, make_temp_dir, package_reports
 from utilities.templates import NumberedCanvas, OneColDocTemplate
 from utilities.progress_utilities import increment_progress, update_details, update_label
 from utilities.styles import define_text_styles
 
-def _float_to_timecode(seconds) :
+class _TimecodeFormatter(object):
     """
-    Placeholder function to quickly convert a floating point number to a
-    timecode without taking fps into account. Functionality should be 
-    replaced with the python 'timecode' module if required going forward.
-    
-    :param seconds: Floating-point number of seconds to convert 
-    :returns string: String conversion of input seconds to HH:MM:SS.MS format
+    Converts columns of times to SMPTE timecode strings, HH:MM:SS:FF or
+    HH:MM:SS;FF for drop-frame, at a given frame rate. Formatted values are
+    cached since the same times tend to come up across a whole turnover.
     """
-    if not isinstance(seconds, float) and not isinstance(seconds, int):
-        return  ""
-    hrs = seconds / 3600.00
-    (hrs_f, hrs_i) = math.modf(hrs)
-    mins = hrs_f * 60
-    (mins_f, mins_i) = math.modf(mins)
-    secs = mins_f * 60 
-    (secs_f, secs_i) = math.modf(secs)
-    return "%02.0f:%02.0f:%02.0f.%s" % (hrs_i, mins_i, secs_i, str(secs_f)[2:4])
+    def __init__(self, fps=24, drop_frame=False):
+        """
+        :param fps: Frame rate, ie. 23.976, 24, 29.97
+        :param drop_frame: True to use drop-frame timecode. Only valid for
+                           29.97 and 59.94 fps.
+        """
+        self.fps = float(fps)
+        self._base = int(round(self.fps))
+        self._drop = 0
+        if drop_frame:
+            if self._base % 30:
+                raise ValueError("Drop-frame timecode requires a 29.97 or 59.94 "
+                                 "fps frame rate, not %s" % fps)
+            # 2 frames a minute are dropped at 29.97 fps, 4 at 59.94 fps.
+            self._drop = self._base / 15
+        self._cache = {}
+
+    def format_column(self, values, unit="seconds"):
+        """
+        Convert a whole column of times to timecode strings in one pass.
+
+        :param values: Iterable of times. Values that aren't numbers are
+                       converted to an empty string.
+        :param unit: Unit of the input values, 'seconds' or 'frames'
+        :returns list: Timecode strings in the same order as the input values
+        """
+        scale = self.fps if unit == "seconds" else 1
+        cache = self._cache
+        to_timecode = self._frames_to_timecode
+        column = []
+        for value in values:
+            # Keyed by type too, as True == 1 == 1.0 but they don't all
+            # format the same.
+            key = (unit, type(value), value)
+            timecode = cache.get(key)
+            if timecode is None:
+                if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+                    timecode = to_timecode(int(round(value * scale)))
+                else:
+                    timecode = ""
+                cache[key] = timecode
+            column.append(timecode)
+        return column
+
+    def _frames_to_timecode(self, frames):
+        sign = "-" if frames < 0 else ""
+        frames = abs(frames)
+        if self._drop:
+            # Add back the frame numbers skipped at the start of every minute,
+            # except every tenth minute, so they can be counted at the
+            # nominal frame rate below.
+            frames_per_10_mins = self._base*600 - self._drop*9
+            frames_per_min = self._base*60 - self._drop
+            (tens, remainder) = divmod(frames, frames_per_10_mins)
+            frames += self._drop * 9 * tens
+            if remainder > self._drop:
+                frames += self._drop * ((remainder - self._drop) // frames_per_min)
+        (secs, ff) = divmod(frames, self._base)
+        (mins, ss) = divmod(secs, 60)
+        (hh, mins) = divmod(mins, 60)
+        return "%s%02d:%02d:%02d%s%02d" % (sign, hh, mins, ss, ";" if self._drop else ":", ff)
+
+
+# Hook instance used by the PDF render worker processes. It is handed to each
+# worker by the pool initializer, which relies on the workers being forked so
+# the Hook (and its app) never has to be pickled.
+_render_hook = None
+
+def _init_render_worker(hook):
+    """
+    Pool initializer for the PDF render worker processes.
+
+    :param hook: ShotPlateTurnover instance the workers render with
+    """
+    global _render_hook
+    _render_hook = hook
+
+def _render_shot_worker(job):
+    """
+    Render a single Shot Turnover PDF inside a worker process.
+
+    :param job: Tuple of (index, filename, shot, segments, versions, notes)
+    :returns tuple: The (index, filename) of the rendered PDF and the number
+                    of seconds it took to render
+    """
+    (index, filename, shot, segments, versions, notes) = job
+    start_time = time.time()
+    _render_hook.buildShotPDF(filename, shot, segments, versions, notes)
+    return (index, filename, time.time() - start_time)
+
+
+def _report_fingerprint(turnover_type, shot, segments, versions, notes):
+    """
+    Fingerprint all the Shotgun data a Shot Turnover PDF is built from, so
+    it can be told whether a previously uploaded report is still current.
+
+    :param turnover_type: Type of turnover report, ie. 'plate' or 'bid'
+    :param shot: Shot entity the report is for
+    :param segments: List of turnover Segments for the Shot
+    :param versions: List of turnover Versions for the Shot
+    :param notes: List of turnover Notes for the Shot
+    :returns string: Hex digest of the report data
+    """
+    data = [turnover_type, shot, segments, versions, notes]
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str)).hexdigest()
+
+
+def _merge_delivered(rendered_pdfs, delivered):
+    """
+    Merge the reports delivered again from a previous run into the rendered
+    ones, in job index order.
+
+    :param rendered_pdfs: Iterable of (index, filename, render time) tuples
+                          of the rendered PDFs, in index order
+    :param delivered: Dictionary of the delivered report files keyed by job
+                      index
+    :returns: Generator of (index, filename, render time) tuples, the render
+              time being None for the delivered reports
+    """
+    pending = collections.deque(sorted(delivered.iteritems()))
+    for rendered in rendered_pdfs:
+        while pending and pending[0][0] < rendered[0]:
+            yield pending.popleft() + (None,)
+        yield rendered
+    for (index, filename) in pending:
+        yield (index, filename, None)
+
+
+class _ReportMetrics(object):
+    """
+    Thread safe record of the Shotgun calls a report makes, what it uploads
+    and how long its phases and PDFs take, so a slow report can be put down
+    to Shotgun, reportlab or the network.
+    """
+    def __init__(self):
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+        self._sg_calls = {}
+        self._phases = {}
+        self._render_times = []
+        self._pdf_sizes = []
+        self._bytes_uploaded = 0
+
+    def record_sg_call(self, name, seconds, failed=False):
+        with self._lock:
+            call = self._sg_calls.setdefault(name,
+                {"count": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0})
+            call["count"] += 1
+            call["errors"] += int(failed)
+            call["total_time"] += seconds
+            call["max_time"] = max(call["max_time"], seconds)
+
+    def record_upload(self, num_bytes):
+        with self._lock:
+            self._bytes_uploaded += num_bytes
+
+    def record_pdf(self, render_time, pdf_size):
+        with self._lock:
+            self._render_times.append(render_time)
+            self._pdf_sizes.append(pdf_size)
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def summary(self, num_shots):
+        """
+        :param num_shots: Number of Shots the report was run for
+        :returns dict: JSON serializable summary of the metrics
+        """
+        def stats(values):
+            total = sum(values)
+            return {"total": total, "max": max(values or [0]),
+                    "mean": total / len(values) if values else 0}
+
+        with self._lock:
+            wall_time = time.time() - self.start_time
+            sg_calls = {}
+            for (name, call) in self._sg_calls.iteritems():
+                sg_calls[name] = dict(call, mean_time=call["total_time"] / call["count"])
+            return {
+                "shots": num_shots,
+                "pdfs_rendered": len(self._render_times),
+                "wall_time": wall_time,
+                "shots_per_second": num_shots / wall_time if wall_time else 0,
+                "phases": dict(self._phases),
+                "shotgun_calls": sg_calls,
+                "bytes_uploaded": self._bytes_uploaded,
+                "pdf_size": stats(self._pdf_sizes),
+                "render_time": stats(self._render_times),
+            }
+
+
+class _MeteredShotgun(object):
+    """
+    Wraps a Shotgun connection to record the count and latency of its find,
+    upload and update calls, and the number of bytes uploaded.
+    """
+    METERED_CALLS = ("find", "find_one", "upload", "update", "download_attachment")
+
+    def __init__(self, shotgun, metrics):
+        """
+        :param shotgun: Shotgun connection to wrap
+        :param metrics: _ReportMetrics to record the calls in
+        """
+        self._shotgun = shotgun
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._shotgun, name)
+        if name not in self.METERED_CALLS:
+            return attr
+
+        def metered_call(*args, **kwargs):
+            start_time = time.time()
+            try:
+                result = attr(*args, **kwargs)
+            except:
+                self._metrics.record_sg_call(name, time.time() - start_time, True)
+                raise
+            self._metrics.record_sg_call(name, time.time() - start_time)
+            if name == "upload":
+                self._metrics.record_upload(os.path.getsize(args[2]))
+            return result
+        return metered_call
+
+
+class _AttachmentUploader(object):
+    """
+    Bounded queue of report attachments that get uploaded to Shotgun by a
+    pool of background threads, so the next report can be rendered while
+    the previous one is still uploading.
+    """
+    def __init__(self, upload_fn, threads=1):
+        """
+        :param upload_fn: Callable run in a background thread for each queued
+                          upload. Any exception it raises marks the upload
+                          as failed.
+        :param threads: Number of uploads to run concurrently
+        """
+        self._upload_fn = upload_fn
+        self._queue = Queue.Queue(maxsize=2*threads)
+        self.submitted = 0
+        self.uploaded = []
+        self.failed = []
+        self._workers = []
+        for i in range(threads):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def put(self, *args):
+        """
+        Queue an upload. Blocks while the queue is full.
+
+        :param args: Arguments to call the upload function with
+        """
+        self._queue.put(args)
+        self.submitted += 1
+
+    def join(self):
+        """
+        Wait for all the queued uploads to finish.
+
+        :returns list: (args, exception) tuples for each failed upload
+        """
+        for worker in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        return self.failed
+
+    def _work(self):
+        while True:
+            args = self._queue.get()
+            if args is None:
+                return
+            try:
+                self.uploaded.append((args, self._upload_fn(*args)))
+            except Exception, e:
+                self.failed.append((args, e))
+
+
+class _ThumbnailCache(object):
+    """
+    On disk cache of entity thumbnails, downsampled to the size they're
+    drawn at in the reports. Thumbnails are keyed by entity and thumbnail
+    url, so a thumbnail is only downloaded again once it has changed.
+    """
+    def __init__(self, cache_dir, max_size, download_fn):
+        """
+        :param cache_dir: Directory to keep the cached thumbnails in
+        :param max_size: Size in pixels to downsample the thumbnails to fit in
+        :param download_fn: Callable that downloads a url to a file path
+        """
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._download_fn = download_fn
+
+    def path(self, entity):
+        """
+        :param entity: Entity dictionary with its 'image' thumbnail url
+        :returns string: Path to the cached thumbnail for the entity
+        """
+        # Thumbnail urls are signed with a new expiry every time they're
+        # queried, so only the file location is part of the key.
+        (scheme, netloc, url_path, query, fragment) = urlparse.urlsplit(entity["image"])
+        return os.path.join(self._cache_dir, "%s_%d_%s.jpg" % (
+            entity["type"], entity["id"], hashlib.sha1(netloc + url_path).hexdigest()))
+
+    def fetch(self, entities, threads=1):
+        """
+        Make sure the thumbnails of the entities are in the cache, downloading
+        the ones that aren't concurrently.
+
+        :param entities: List of entity dictionaries with their 'image'
+                         thumbnail urls
+        :param threads: Number of thumbnails to download at the same time
+        :returns dict: Cached thumbnail paths keyed by entity id. Entities
+                       without a thumbnail, or whose thumbnail failed to
+                       download, are left out.
+        """
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        entities = [e for e in entities if e.get("image")]
+        missing = [e for e in entities if not os.path.isfile(self.path(e))]
+        if missing:
+            pool = ThreadPool(max(1, min(threads, len(missing))))
+            try:
+                pool.map(self._download, missing)
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+
+        paths = {}
+        for entity in entities:
+            path = self.path(entity)
+            if os.path.isfile(path):
+                paths[entity["id"]] = path
+        return paths
+
+    def _download(self, entity):
+        path = self.path(entity)
+        temp_path = "%s.%d.download" % (path, threading.current_thread().ident)
+        try:
+            self._download_fn(entity["image"], temp_path)
+            if PILImage:
+                image = PILImage.open(temp_path)
+                image.thumbnail((self._max_size, self._max_size), PILImage.ANTIALIAS)
+                image.convert("RGB").save(temp_path, "JPEG", quality=90)
+            os.rename(temp_path, path)
+        except Exception:
+            # The report is built without this thumbnail.
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            return
+
+        # Remove any thumbnails cached for the entity before this one.
+        prefix = os.path.join(self._cache_dir, "%s_%d_" % (entity["type"], entity["id"]))
+        for old_path in glob.glob(prefix + "*.jpg"):
+            if old_path != path:
+                os.remove(old_path)
+
+
+class _ReportLayout(object):
+    """
+    Page layout, styles, colors, table styles and the logo image used by
+    every Shot Turnover PDF. These are the same for every Shot, so they are
+    created once per report run and shared by all of its PDFs.
+    """
+    def __init__(self, logo_path=""):
+        """
+        :param logo_path: Path to the logo image to display in the header.
+                          No logo is displayed if empty.
+        """
+        # layout properties -- constants used throughout report
+        self.margin = 0.25*inch
+        self.padding = 0.15*inch
+        (width, height) = letter
+        content_width = width - 2*self.margin
+        quarter_width = content_width / 4
+        half_width = content_width / 2
+
+        # define styles and colors
+        self.styles = define_text_styles()
+        dark_grey = colors.Color(0.66, 0.66, 0.66)
+        light_grey = colors.Color(0.8, 0.8, 0.8)
+        jaunt_green = colors.Color(0.741, 1, 0)
+        self.note_style = ParagraphStyle(fontName="Helvetica", name="NoteText")
+
+        # The logo is loaded and scaled once, and the same flowable is drawn
+        # in the header of every PDF.
+        self.logo = ""
+        if logo_path:
+            self.logo = Image(logo_path)
+            self.logo.drawHeight = quarter_width*self.logo.drawHeight / self.logo.drawWidth
+            self.logo.drawWidth = quarter_width
+
+        # Shot thumbnails are drawn at the width of the logo.
+        self.thumbnail_width = quarter_width
+
+        # Header Table column widths and cell formatting.
+        self.header_col_widths = [quarter_width, 0.9*half_width, 1.2*quarter_width/2, 1.2*quarter_width/2]
+        self.header_style = TableStyle([
+            ("BACKGROUND",  (0,0), (-1,2),  light_grey),
+            ("SPAN",        (0,0), (0,2)),
+            ("VALIGN",      (0,0), (0,2),   "TOP"),
+            ("SPAN",        (1,0), (1,1)),
+            ("ALIGN",       (1,0), (1,2),   "CENTER"),
+            ("VALIGN",      (1,0), (1,2),   "MIDDLE"),
+            ("FONT",        (1,0), (1,0),   "Helvetica-Bold", 18),
+            ("FONT",        (1,1), (1,2),   "Helvetica-Bold", 14),
+            ("ALIGN",       (2,0), (2,2),   "LEFT"),
+            ("FONT",        (2,0), (2,2),   "Helvetica-Oblique", 12),
+            ("ALIGN",       (3,0), (3,2),   "RIGHT"),
+            ("FONT",        (3,0), (3,2),   "Helvetica", 12),
+            ("LINEBELOW",   (0,2), (-1,2),  2, jaunt_green),
+            ("ALIGN",       (0,3), (0,3),   "LEFT"),
+            ("VALIGN",      (0,3), (0,3),   "TOP"),
+            ("FONT",        (0,3), (0,3),   "Helvetica-BoldOblique", 12),
+            ("SPAN",        (1,3), (-1,3)),
+            ("ALIGN",       (1,3), (-1,3),  "LEFT"),
+            ("FONT",        (1,3), (-1,3),  "Helvetica", 12),
+            ("ALIGN",       (0,4), (0,4),   "LEFT"),
+        ])
+
+        # Turnover Materials Table column widths and cell formatting.
+        self.materials_col_widths = [half_width]*2
+        self.materials_style = TableStyle([
+            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
+            ("FONT",        (0,0), (-1,0),  "Helvetica-Bold", 12),
+            ("ALIGN",       (0,0), (-1,-1), "LEFT"),
+            ("FONT",        (0,1), (-1,-1), "Helvetica", 10),
+        ])
+
+        # Editorial Table column widths and cell formatting.
+        self.editorial_col_widths = [half_width] + [content_width/10]*5
+        self.editorial_style = TableStyle([
+            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
+            ("SPAN",        (0,0), (-1,0)),
+            ("FONT",        (0,0), (0,0),   "Helvetica-BoldOblique", 12),
+            ("ALIGN",       (0,0), (1,-1),  "CENTER"),
+            ("ALIGN",       (0,1), (0,1),   "LEFT"), 
+            ("BACKGROUND",  (0,1), (-1,1),  light_grey),
+            ("FONT",        (0,1), (-1,1),  "Helvetica-Bold", 10),
+            ("FONT",        (0,2), (-1,-1), "Helvetica", 10),
+            ("ALIGN",       (0,2), (0,-1),  "LEFT"),
+            ("ALIGN",       (1,2), (-1,-1), "CENTER")
+        ])
+
+        # Notes Table column width(s) and cell formatting.
+        self.notes_col_widths = [content_width]
+        self.notes_style = TableStyle([
+            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
+            ("FONT",        (0,0), (-1,0),  "Helvetica-BoldOblique", 12),
+            ("ALIGN",       (0,0), (-1,-1), "LEFT"),
+            ("FONT",        (0,1), (-1,-1), "Helvetica", 12),
+        ])
+
+    def thumbnail(self, image_path):
+        """
+        :param image_path: Path to a thumbnail image
+        :returns: Image flowable of the thumbnail scaled to the thumbnail width
+        """
+        image = Image(image_path)
+        image.drawHeight = self.thumbnail_width*image.drawHeight / image.drawWidth
+        image.drawWidth = self.thumbnail_width
+        return image
 
 
 class ShotPlateTurnover(Hook):
@@ -58,7 +538,8 @@ class ShotPlateTurnover(Hook):
         this report.
 
         :param app: This Toolkit Application instance
-        :param thread: Current thread this Hook is running in
+        :param thread: Current thread this Hook is running in, or None when
+                       running headless
         :param entity_type: Entity type of the incoming list of entity ids
         :param entity_ids: List of selected entity ids to process
         :param progress_ct: Progress counter corresponding to the progress bar
@@ -71,7 +552,6 @@ class ShotPlateTurnover(Hook):
         """
         # Set some local variables used throughout the report generation
         # process. Similar to what would typically be set in __init__()
-        self._downloaded_thumb_paths = {}
         self._segments_by_shot = {}
         self._versions_by_shot = {}
         self._notes_by_shot = {}
@@ -84,6 +564,8 @@ class ShotPlateTurnover(Hook):
             self._report_config.get("date_time_format")
         )
         self.progress_ct = progress_ct
+        self._layout = _ReportLayout(self._jaunt_logo())
+        self._metrics = _ReportMetrics()
     
         # Check to make sure this report can handle the selected entity type
         valid_types = self._report_config["valid_entity_types"]
@@ -94,31 +576,150 @@ class ShotPlateTurnover(Hook):
         turnover_type = str(report_hook_config.get("short_name")).split("_")[0]
 
         # grab shots
-        update_details(self._thread, "Finding shots")
+        self._update_details("Finding shots")
         shot_fields = [
             "code", 
+            "image",
             "project.Project.sg_release_title",
             "sg_turnover_notes___linked_field", 
         ]
+        fps_field = self._report_config.get("timecode_fps_field")
+        if fps_field:
+            shot_fields.append("project.Project.%s" % fps_field)
         if turnover_type == "plate": 
             shot_fields.extend([
                 "sg_awarded_vendor", 
                 "sg_awarded_vendor.HumanUser.sg_vendor_code", 
             ])
-        shots = find_entities_by_ids(self._app.shotgun, entity_type, entity_ids, shot_fields, [])
+        shots = find_entities_by_ids(self._shotgun, entity_type, entity_ids, shot_fields, [])
+
+        # Timecodes are at the frame rate of the Project, the fps setting is
+        # only used when the Project doesn't have one.
+        project_fps = None
+        if fps_field and shots:
+            project_fps = shots[0].get("project.Project.%s" % fps_field)
+        self._timecode = _TimecodeFormatter(
+            project_fps or self._report_config.get("timecode_fps") or 24,
+            self._report_config.get("timecode_drop_frame") or False)
         
-        # Load thumbnails to display in report, if ever requested.
-        #update_details(self._thread, "Retrieving Shot thumbnails")
-        #self._downloaded_thumb_paths["Shot"] = retrieve_thumbnails("Shot", shots, self._temp_dir)
+        # Load thumbnails to display in report. The thumbnail url is replaced
+        # with the path to the cached thumbnail, which only changes along with
+        # the thumbnail itself.
+        thumb_paths = {}
+        if self._report_config.get("thumbnails"):
+            self._update_details("Retrieving Shot thumbnails")
+            thumb_paths = self._thumbnail_cache().fetch(shots,
+                int(self._report_config.get("thumbnail_threads") or 1))
+        for shot in shots:
+            shot["image"] = thumb_paths.get(shot["id"])
         
-        # Build the PDF files
-        update_label(self._thread, "Building PDFs...")
-        turnover_files = self._build_standard_files(shots, turnover_type)
-    
-        # Package them up 
+        # When zipping, each PDF is added to the archive as soon as it's built
+        # and then removed from the temp dir once it's been uploaded, so the
+        # temp dir never has to hold the whole set of PDFs.
         zip_files = self._report_config.get("zip_all_files") or False
-        return package_reports(self._destination_dir, turnover_files, self._temp_dir,
-                               create_zip=zip_files, zip_name="plate_turnovers.zip")
+        self._report_zip = None
+        if zip_files:
+            self._report_zip = zipfile.ZipFile(
+                os.path.join(self._destination_dir, "plate_turnovers.zip"),
+                "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+
+        # Build the PDF files
+        self._update_label("Building PDFs...")
+        try:
+            turnover_files = self._build_standard_files(shots, turnover_type)
+        finally:
+            if self._report_zip:
+                self._report_zip.close()
+
+        start_time = time.time()
+        if self._report_zip:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            result = self._report_zip.filename
+        else:
+            # Package them up 
+            result = package_reports(self._destination_dir, turnover_files, self._temp_dir,
+                                     create_zip=False, zip_name="plate_turnovers.zip")
+        self._metrics.record_phase("package", time.time() - start_time)
+
+        self._report_metrics(len(shots))
+        return result
+
+
+    def _update_details(self, msg):
+        """
+        Show a progress message in the details of the progress dialog, or
+        log it when running headless without a progress thread.
+        """
+        if self._thread is None:
+            self._app.log_info(msg)
+        else:
+            update_details(self._thread, msg)
+
+
+    def _update_label(self, msg):
+        """
+        Show a progress message in the label of the progress dialog, or log
+        it when running headless without a progress thread.
+        """
+        if self._thread is None:
+            self._app.log_info(msg)
+        else:
+            update_label(self._thread, msg)
+
+
+    def _increment_progress(self, progress_ct):
+        """
+        Move the progress bar to the given count. Does nothing when running
+        headless without a progress thread.
+        """
+        if self._thread is not None:
+            increment_progress(self._thread, progress_ct)
+
+
+    @property
+    def _shotgun(self):
+        """
+        The app's Shotgun connection for the current thread, wrapped to
+        record metrics for the calls made with it.
+        """
+        return _MeteredShotgun(self._app.shotgun, self._metrics)
+
+
+    def _report_metrics(self, num_shots):
+        """
+        Write a JSON summary of the metrics recorded while building the
+        report to the app's cache location if the report's 'write_metrics'
+        setting is on, and log it if its 'log_metrics' setting is on. The
+        summary is kept out of the destination folder, which is delivered
+        to the vendors.
+
+        :param num_shots: Number of Shots the report was run for
+        """
+        summary = self._metrics.summary(num_shots)
+        if self._report_config.get("write_metrics"):
+            metrics_dir = os.path.join(self._app.cache_location, "turnover_metrics")
+            if not os.path.isdir(metrics_dir):
+                os.makedirs(metrics_dir)
+            metrics_path = os.path.join(metrics_dir, to_safe_file_name(
+                "%s_metrics_%s.json" % (self._report_config.get("short_name"),
+                self._app.evaluate_template(self._date_time_format_templ))))
+            self._app.log_debug("Writing report metrics to %s" % metrics_path)
+            with open(metrics_path, "w") as metrics_file:
+                json.dump(summary, metrics_file, indent=2, sort_keys=True)
+        if self._report_config.get("log_metrics"):
+            self._app.log_info("Report metrics: %s" % json.dumps(summary, sort_keys=True))
+
+
+    def _thumbnail_cache(self):
+        """
+        :returns: _ThumbnailCache that downsamples thumbnails to the size they
+                  are drawn at, at the report's 'thumbnail_dpi' setting
+        """
+        dpi = self._report_config.get("thumbnail_dpi") or 150
+        return _ThumbnailCache(
+            os.path.join(self._app.cache_location, "turnover_thumbnails"),
+            int(self._layout.thumbnail_width / inch * dpi),
+            lambda url, path: tank.util.download_url(self._app.shotgun, url, path))
 
 
     def _jaunt_logo(self):
@@ -151,6 +752,7 @@ class ShotPlateTurnover(Hook):
         :param entity: Shotgun Entity to attach report pdf to
         :param report_pdf: File path to the report pdf to attach
         :param report_type: Optional string to set the new Attachment's sg_type to 
+        :returns: Id of the new Attachment, or None if nothing was uploaded
         """
         # Make sure an id and type has been specified for the incoming Entity
         if not entity.get("id") or not entity.get("type"):
@@ -167,18 +769,57 @@ class ShotPlateTurnover(Hook):
         if not os.path.isfile(report_pdf):
             msg = ("Cannot upload %s. Report pdf [%s] does not exist." %
                   (e_msg, report_pdf))
-            update_details(self._thread, msg)
+            self._update_details(msg)
             return
 
         # Attach the report to the specified entity and update the attachment
-        # type if specified.
-        update_details(self._thread,
+        # type if specified. Each step is retried on its own so a failed
+        # update doesn't upload a duplicate Attachment. Note that the Shotgun
+        # connection is looked up on each call since it is cached per thread.
+        self._update_details(
             ("Uploading %s pdf [%s] ..." % (e_msg, os.path.basename(report_pdf))))
-        uploaded_id = self._app.shotgun.upload(e_type, e_id, report_pdf)
+        uploaded_id = self._retry_sg_call(
+            lambda: self._shotgun.upload(e_type, e_id, report_pdf))
         if report_type and uploaded_id:
-            update_details(self._thread,
+            self._update_details(
                 ("Setting Attachment.sg_type to [%s] ..." % report_type))
-            self._app.shotgun.update("Attachment", uploaded_id, {"sg_type": report_type})
+            self._retry_sg_call(lambda: self._shotgun.update(
+                "Attachment", uploaded_id, {"sg_type": report_type}))
+        return uploaded_id
+
+
+    def _attach_and_remove_report(self, entity, report_pdf, report_type=None):
+        """
+        Attach a report pdf that has already been added to the zip archive
+        to the given entity, then remove it from disk.
+
+        See _attach_report_to_sg_entity() for the parameters and return value.
+        """
+        try:
+            return self._attach_report_to_sg_entity(entity, report_pdf, report_type)
+        finally:
+            if os.path.isfile(report_pdf):
+                os.remove(report_pdf)
+
+
+    def _retry_sg_call(self, sg_call):
+        """
+        Run a Shotgun call, retrying it up to the report's 'upload_retries'
+        setting number of times with an increasing delay between attempts.
+
+        :param sg_call: Callable that makes the Shotgun call
+        :returns: The result of the Shotgun call
+        """
+        retries = int(self._report_config.get("upload_retries") or 0)
+        for attempt in range(retries + 1):
+            try:
+                return sg_call()
+            except Exception, e:
+                if attempt == retries:
+                    raise
+                self._update_details(
+                    "Shotgun call failed (%s), retrying ..." % e)
+                time.sleep(attempt + 1)
 
 
     def _build_standard_files(self, shots, turnover_type):
@@ -188,40 +829,316 @@ class ShotPlateTurnover(Hook):
 
         :param shots: List of Shot entities to generate Turnover reports for
         """
-        pdfs = []
-        
         # Gather the relevant Entites from Shotgun
-        update_details(self._thread, "Finding segments")
-        self.findTurnoverSegments(shots)
-        update_details(self._thread, "Finding versions")
-        self.findTurnoverVersions(shots)
-        update_details(self._thread, "Finding notes")
-        self.findTurnoverNotes(shots)
+        self._fetch_turnover_data(shots)
         
-        # Build a PDF report file for each input Shot.
-        for shot in shots:
-            update_details(self._thread, "Building %s PDF" % shot["code"])
-
-            # Determine the output file name for the PDF. Includes a time stamp
-            # in the file name to prevent files from being overwritten.
+        # Determine the output file name for each PDF up front, so names and
+        # order don't depend on the order the PDFs finish rendering in.
+        # Includes a time stamp in the file name to prevent files from being
+        # overwritten.
+        jobs = []
+        for (index, shot) in enumerate(shots):
             pdf_basename = "%s_%sTurnover_%s.pdf" % (
                             shot["code"],
                             str(turnover_type).capitalize(),
                             self._app.evaluate_template(self._date_time_format_templ))
             shot_pdf = os.path.join(self._temp_dir, to_safe_file_name(pdf_basename))
+            jobs.append((index, shot_pdf, shot,
+                         self._segments_by_shot.get(shot["id"]) or [],
+                         self._versions_by_shot.get(shot["id"]) or [],
+                         self._notes_by_shot.get(shot["id"]) or []))
+
+        # Skip the Shots whose report data hasn't changed since their last
+        # report was uploaded.
+        fingerprints = {}
+        for job in jobs:
+            fingerprints[job[0]] = _report_fingerprint(turnover_type, *job[2:])
+        # Their last report is delivered again in place of a new one.
+        pdfs = [job[1] for job in jobs]
+        delivered = {}
+        if self._report_config.get("incremental") and not self._report_config.get("force"):
+            (jobs, unchanged) = self._changed_report_jobs(jobs, fingerprints, turnover_type)
+            (delivered, failed_jobs) = self._deliver_previous_reports(unchanged)
+            jobs = sorted(jobs + failed_jobs)
+
+        # Reports are uploaded in the background while the next ones render.
+        # Rendering has to be started first, see _render_pdfs().
+        rendered_pdfs = self._render_pdfs(jobs)
+        upload_fn = self._attach_report_to_sg_entity
+        if self._report_zip:
+            upload_fn = self._attach_and_remove_report
+        uploader = _AttachmentUploader(upload_fn,
+            int(self._report_config.get("upload_threads") or 1))
 
-            # Build the PDF with reportlab mojo
-            self.buildShotPDF(shot_pdf, shot)
-            pdfs.append(shot_pdf)
+        # Build a PDF report file for each input Shot. The uploads already
+        # queued are waited for even if rendering fails.
+        start_time = time.time()
+        try:
+            for (index, shot_pdf, render_time) in _merge_delivered(rendered_pdfs, delivered):
+                if render_time is None:
+                    # Delivered again, already uploaded and counted.
+                    if self._report_zip:
+                        self._report_zip.write(shot_pdf, os.path.basename(shot_pdf))
+                        os.remove(shot_pdf)
+                    continue
+                self._metrics.record_pdf(render_time, os.path.getsize(shot_pdf))
+                if self._report_zip:
+                    self._report_zip.write(shot_pdf, os.path.basename(shot_pdf))
 
-            # Upload the report to the Shot for future reference.
-            self._attach_report_to_sg_entity(shot, shot_pdf, "Turnover PDF")
+                # Upload the report to the Shot for future reference.
+                uploader.put(shots[index], shot_pdf, "Turnover PDF")
 
-            # Update the progress bar the user is looking at right now.
-            self.progress_ct += 1
-            increment_progress(self._thread, self.progress_ct)
+                # Update the progress bar the user is looking at right now.
+                self.progress_ct += 1
+                self._increment_progress(self.progress_ct)
+
+            self._metrics.record_phase("render", time.time() - start_time)
+        finally:
+            self._update_details("Waiting for uploads to finish")
+            start_time = time.time()
+            failed = uploader.join()
+            self._metrics.record_phase("upload_wait", time.time() - start_time)
+            if failed:
+                msg = "%d of %d report uploads failed:" % (len(failed), uploader.submitted)
+                for (args, e) in failed:
+                    msg += "\n  %s : %s" % (os.path.basename(args[1]), e)
+                self._update_details(msg)
+                self._app.log_warning(msg)
+
+        # Record what each uploaded report was built from for the next run.
+        # The manifest is reloaded first to keep entries from concurrent runs.
+        pdf_indices = dict((job[1], job[0]) for job in jobs)
+        manifest = self._load_report_manifest()
+        for ((shot, shot_pdf, report_type), uploaded_id) in uploader.uploaded:
+            if uploaded_id:
+                manifest["%s_%d" % (turnover_type, shot["id"])] = {
+                    "fingerprint": fingerprints[pdf_indices[shot_pdf]],
+                    "attachment_id": uploaded_id,
+                }
+        self._save_report_manifest(manifest)
         return pdfs
-    
+
+
+    def _changed_report_jobs(self, jobs, fingerprints, turnover_type):
+        """
+        Filter out the render jobs for Shots whose last uploaded report was
+        built from the same data, and whose Attachment still exists.
+
+        :param jobs: List of (index, filename, shot, segments, versions, notes)
+                     tuples, one per Shot
+        :param fingerprints: Report data fingerprints keyed by job index
+        :param turnover_type: Type of turnover report, ie. 'plate' or 'bid'
+        :returns: (list of the render jobs for the Shots that changed, list
+                  of (job, Attachment id) tuples for the unchanged Shots) tuple
+        """
+        manifest = self._load_report_manifest()
+        unchanged = {}
+        for job in jobs:
+            entry = manifest.get("%s_%d" % (turnover_type, job[2]["id"])) or {}
+            if entry.get("fingerprint") == fingerprints[job[0]]:
+                unchanged[entry["attachment_id"]] = job[0]
+
+        # Reports whose Attachment has since been deleted are rebuilt.
+        if unchanged:
+            attachments = self._shotgun.find("Attachment",
+                [["id", "in", unchanged.keys()]], ["id"]) or []
+            unchanged = dict((unchanged[a["id"]], a["id"]) for a in attachments)
+
+        if unchanged:
+            msg = "Skipping %d unchanged shot(s)" % len(unchanged)
+            self._update_details(msg)
+            self._app.log_debug(msg)
+        return ([job for job in jobs if job[0] not in unchanged],
+                [(job, unchanged[job[0]]) for job in jobs if job[0] in unchanged])
+
+
+    def _deliver_previous_reports(self, unchanged):
+        """
+        Download the last uploaded report of each unchanged Shot to the file
+        its new report would have been written to, so the delivery still has
+        a report for every Shot.
+
+        :param unchanged: List of (job, Attachment id) tuples for the Shots
+                          whose report data hasn't changed
+        :returns: (dictionary of the downloaded report files keyed by job
+                  index, list of the jobs whose report failed to download,
+                  which have to be rendered instead) tuple
+        """
+        if not unchanged:
+            return ({}, [])
+
+        def download(entry):
+            (job, attachment_id) = entry
+            try:
+                self._retry_sg_call(lambda: self._shotgun.download_attachment(
+                    {"type": "Attachment", "id": attachment_id}, file_path=job[1]))
+            except Exception, e:
+                self._app.log_warning("Rebuilding the %s report, its last one failed to download: %s" %
+                                      (job[2]["code"], e))
+                return job
+
+        self._update_details("Delivering %d unchanged report(s)" % len(unchanged))
+        pool = ThreadPool(max(1, min(int(self._report_config.get("upload_threads") or 1), len(unchanged))))
+        try:
+            failed = [job for job in pool.map(download, unchanged) if job]
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+        delivered = dict((job[0], job[1]) for (job, attachment_id) in unchanged if job not in failed)
+        self.progress_ct += len(delivered)
+        self._increment_progress(self.progress_ct)
+        return (delivered, failed)
+
+
+    def _report_manifest_path(self):
+        return os.path.join(self._app.cache_location, "turnover_report_manifest.json")
+
+
+    def _load_report_manifest(self):
+        """
+        Load the manifest of the reports uploaded by previous runs, which maps
+        '<turnover type>_<shot id>' to the fingerprint of the data the last
+        report was built from and the id of its Attachment.
+
+        :returns dict: The report manifest, empty if there isn't one yet
+        """
+        manifest_path = self._report_manifest_path()
+        if not os.path.isfile(manifest_path):
+            return {}
+        try:
+            with open(manifest_path) as manifest_file:
+                return json.load(manifest_file)
+        except (IOError, ValueError), e:
+            self._app.log_warning("Ignoring unreadable report manifest %s: %s" %
+                                  (manifest_path, e))
+            return {}
+
+
+    def _save_report_manifest(self, manifest):
+        """
+        Write the report manifest. It is written to a temporary file first so
+        a concurrent run never reads a partially written manifest.
+
+        :param manifest: Report manifest to save
+        """
+        manifest_path = self._report_manifest_path()
+        if not os.path.isdir(os.path.dirname(manifest_path)):
+            os.makedirs(os.path.dirname(manifest_path))
+        temp_path = "%s.%d" % (manifest_path, os.getpid())
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.rename(temp_path, manifest_path)
+
+
+    def _render_pdfs(self, jobs):
+        """
+        Render the PDF for each job, either one after another or across a
+        pool of worker processes if the report's 'render_processes' setting
+        is greater than 1.
+
+        :param jobs: List of (index, filename, shot, segments, versions, notes)
+                     tuples, one per Shot
+        :returns: Iterator of (index, filename, render time) tuples, in job
+                  order
+        """
+        processes = min(int(self._report_config.get("render_processes") or 1), len(jobs))
+
+        # The workers are handed this Hook by forking, which isn't available
+        # on Windows, and isn't safe on OSX once Qt is loaded, as it is in
+        # Nuke or Shotgun Desktop.
+        if processes < 2 or sys.platform in ("win32", "darwin"):
+            return self._render_pdfs_serially(jobs)
+
+        # The pool forks its workers right away, so this has to be called
+        # before any other threads (like the upload threads) are started.
+        self._update_details(
+            "Building %d PDFs across %d processes" % (len(jobs), processes))
+        pool = multiprocessing.Pool(processes, _init_render_worker, (self,))
+        return self._render_pdfs_in_pool(pool, jobs, 2*processes)
+
+
+    def _render_pdfs_serially(self, jobs):
+        for job in jobs:
+            self._update_details("Building %s PDF" % job[2]["code"])
+            start_time = time.time()
+            self.buildShotPDF(*job[1:])
+            yield (job[0], job[1], time.time() - start_time)
+
+
+    def _render_pdfs_in_pool(self, pool, jobs, max_pending):
+        """
+        Yield the PDFs rendered by the pool in job order. At most max_pending
+        jobs are handed to the pool at a time, so the workers can't get
+        further ahead of the zip archive and the uploads than that, and the
+        temp dir only holds a bounded number of PDFs waiting to be processed.
+        """
+        pending = collections.deque()
+        jobs = iter(jobs)
+        try:
+            for job in itertools.islice(jobs, max_pending):
+                pending.append((job, pool.apply_async(_render_shot_worker, (job,))))
+            while pending:
+                (job, async_result) = pending.popleft()
+                result = async_result.get()
+                for next_job in itertools.islice(jobs, 1):
+                    pending.append((next_job, pool.apply_async(_render_shot_worker, (next_job,))))
+                self._update_details("Built %s PDF" % job[2]["code"])
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+    def _fetch_turnover_data(self, shots):
+        """
+        Find the turnover Segments, Versions and Notes for the input Shots
+        and map them by Shot. The three queries are run concurrently, each
+        split into chunks of at most the report's 'fetch_chunk_size' setting
+        number of Shots so large selections don't build huge 'in' filters.
+
+        :param shots: List of Shot entities to find turnover data for
+        :returns: None
+        """
+        self._update_details("Finding segments, versions and notes")
+        start_time = time.time()
+
+        chunk_size = int(self._report_config.get("fetch_chunk_size") or len(shots) or 1)
+        chunks = [shots[pos:pos+chunk_size] for pos in range(0, len(shots), chunk_size)]
+
+        queries = [
+            (self._segments_by_shot, self.findTurnoverSegments),
+            (self._versions_by_shot, self.findTurnoverVersions),
+            (self._notes_by_shot, self.findTurnoverNotes),
+        ]
+        tasks = [(by_shot, find_fn, chunk) for (by_shot, find_fn) in queries
+                 for chunk in chunks]
+
+        # Note that each thread gets its own Shotgun connection, since the
+        # connection is cached per thread.
+        threads = int(self._report_config.get("fetch_threads") or len(queries))
+        pool = ThreadPool(max(1, min(threads, len(tasks))))
+        try:
+            results = pool.map(lambda task: task[1](task[2]), tasks)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+        # Merge the results for each chunk into the per Shot mappings.
+        for ((by_shot, find_fn, chunk), result) in zip(tasks, results):
+            for (shot_id, entities) in result.iteritems():
+                by_shot.setdefault(shot_id, []).extend(entities)
+
+        fetch_time = time.time() - start_time
+        self._metrics.record_phase("fetch", fetch_time)
+        msg = ("Found turnover data for %d shots in %d queries (%.2fs)" %
+               (len(shots), len(tasks), fetch_time))
+        self._update_details(msg)
+        self._app.log_debug(msg)
+
 
     def findTurnoverSegments(self, shots) :
         """
@@ -229,7 +1146,7 @@ class ShotPlateTurnover(Hook):
         one of the input Shots. Map lists of Segments by Shot.
 
         :param shots: List of Shot entities to find turnover Segments for
-        :returns: None
+        :returns dict: Lists of Segments keyed by Shot id
         """
         seg_entity = self._report_config["segment_entity"]
         seg_filters = [ 
@@ -247,10 +1164,11 @@ class ShotPlateTurnover(Hook):
             "sg_shot_1.Shot.id",
         ]
         link_field = seg_fields[-1]
-        segments = self._app.shotgun.find(seg_entity, seg_filters, seg_fields) or []
-        self._segments_by_shot = {}
+        segments = self._shotgun.find(seg_entity, seg_filters, seg_fields) or []
+        segments_by_shot = {}
         for s in segments:
-            self._segments_by_shot.setdefault(s.get(link_field), []).append(s)
+            segments_by_shot.setdefault(s.get(link_field), []).append(s)
+        return segments_by_shot
 
 
     def findTurnoverVersions(self, shots) :
@@ -259,7 +1177,7 @@ class ShotPlateTurnover(Hook):
         one of the input Shots. Map lists of Versions by Shot.
     
         :param shots: List of Shot entities to find turnover Versions for
-        :returns: None
+        :returns dict: Lists of Versions keyed by Shot id
         """
         ver_filters = [ 
             ["entity.Shot.id", "in", [s["id"] for s in shots]],
@@ -271,10 +1189,11 @@ class ShotPlateTurnover(Hook):
             "entity.Shot.id",
         ]
         link_field = ver_fields[-1]
-        versions = self._app.shotgun.find("Version", ver_filters, ver_fields) or []
-        self._versions_by_shot = {}
+        versions = self._shotgun.find("Version", ver_filters, ver_fields) or []
+        versions_by_shot = {}
         for v in versions:
-            self._versions_by_shot.setdefault(v.get(link_field), []).append(v)
+            versions_by_shot.setdefault(v.get(link_field), []).append(v)
+        return versions_by_shot
 
 
     def findTurnoverNotes(self, shots) :
@@ -283,7 +1202,7 @@ class ShotPlateTurnover(Hook):
         one of the input Shots. Map lists of Notes by Shot.
     
         :param shots: List of Shot entities to find turnover Notes for
-        :returns: None
+        :returns dict: Lists of Notes keyed by Shot id
         """
         note_filters = [
             ["note_links.Shot.id", "in", [s["id"] for s in shots]],
@@ -295,53 +1214,52 @@ class ShotPlateTurnover(Hook):
             "note_links.Shot.id",
         ]
         link_field = note_fields[-1]
-        notes = self._app.shotgun.find("Note", note_filters, note_fields) or []
-        self._notes_by_shot = {}
+        notes = self._shotgun.find("Note", note_filters, note_fields) or []
+        notes_by_shot = {}
         for n in notes:
-            self._notes_by_shot.setdefault(n.get(link_field), []).append(n)
+            notes_by_shot.setdefault(n.get(link_field), []).append(n)
+        return notes_by_shot
 
 
-    def buildShotPDF(self, filename, shot):
+    def buildShotPDF(self, filename, shot, segments=None, versions=None, notes=None):
         """
         Builds the Shot Turnover PDF file using the reportlab API
 
         :param filename: PDF file name
         :param shot: Shot entity to build report for 
+        :param segments: Optional list of turnover Segments for the Shot.
+                         Looked up from the fetched Segments if not specified.
+        :param versions: Optional list of turnover Versions for the Shot.
+                         Looked up from the fetched Versions if not specified.
+        :param notes: Optional list of turnover Notes for the Shot.
+                      Looked up from the fetched Notes if not specified.
         :returns: None
         """
+        if segments is None:
+            segments = self._segments_by_shot.get(shot["id"]) or []
+        if versions is None:
+            versions = self._versions_by_shot.get(shot["id"]) or []
+        if notes is None:
+            notes = self._notes_by_shot.get(shot["id"]) or []
 
-        """
-        # grab thumbnails -- Might eventually use this. Keeping for posterity.
-        shot["image"] = self._downloaded_thumb_paths["Shot"].get(shot.get("id", -1))
-        # if the path doesn't exist on disk, reset the value so it doesn't fail later
-        if shot["image"] and not os.path.exists(shot["image"]):
-            shot["image"] = None
-        """
-            
-        # layout properties -- constants used throughout report
-        margin = 0.25*inch
-        padding = 0.15*inch
-        (width, height) = letter
-        content_width = width - 2*margin
-        quarter_width = content_width / 4
-        half_width = content_width / 2
+        layout = self._layout
+
+        # grab thumbnails -- if the path doesn't exist on disk, leave it out
+        # so it doesn't fail later
+        thumbnail = ""
+        if shot.get("image") and os.path.exists(shot["image"]):
+            thumbnail = layout.thumbnail(shot["image"])
 
         # create the doc
         doc = OneColDocTemplate(
             filename,
             pagesize=letter,
-            leftMargin=margin,
-            rightMargin=margin,
-            topMargin=margin,
-            bottomMargin=margin,
+            leftMargin=layout.margin,
+            rightMargin=layout.margin,
+            topMargin=layout.margin,
+            bottomMargin=layout.margin,
         )
-
-        # define styles and colors
-        self.styles = define_text_styles()
-        dark_grey = colors.Color(0.66, 0.66, 0.66)
-        light_grey = colors.Color(0.8, 0.8, 0.8)
-        jaunt_green = colors.Color(0.741, 1, 0)
-        note_style = ParagraphStyle(fontName="Helvetica", name="NoteText")
+        self.styles = layout.styles
 
         # content
         story = []
@@ -354,126 +1272,109 @@ class ShotPlateTurnover(Hook):
         vendor_code_label = "Comp Code" if vendor_code else ""
         date_label = "Turnover Date" if vendor_label else "Bid Material Sent"
         turn_notes = safe_para(shot.get("sg_turnover_notes___linked_field") or "",
-                               note_style)
-        header_logo = self._jaunt_logo()
-        if header_logo:
-            header_logo = Image(header_logo)
-            header_logo.drawHeight = quarter_width*header_logo.drawHeight / header_logo.drawWidth
-            header_logo.drawWidth = quarter_width
+                               layout.note_style)
         header_data = [
-            [header_logo,           release_title,      vendor_label,       vendor_name],
+            [layout.logo,           release_title,      vendor_label,       vendor_name],
             ["",                    "",                 vendor_code_label,  vendor_code],
             ["",                    shot["code"],       date_label,         date.today().strftime("%m/%d/%y")],
             ["Turnover Notes : ",   turn_notes,         "",                 ""],
         ]
-        # Add an empty row at the bottom for nice spacing
-        header_data.append([""]*len(header_data[0]))
-
-        # Specify the column widths for the Header Table.
-        col_widths = [quarter_width, 0.9*half_width, 1.2*quarter_width/2, 1.2*quarter_width/2]
+        # Add a row at the bottom with the thumbnail, which is otherwise empty
+        # for nice spacing
+        header_data.append([thumbnail] + [""]*(len(header_data[0]) - 1))
 
         # Create the Header Table and format the cells.
-        header = Table(header_data, colWidths=col_widths)
-        header.setStyle(TableStyle([
-            ("BACKGROUND",  (0,0), (-1,2),  light_grey),
-            ("SPAN",        (0,0), (0,2)),
-            ("VALIGN",      (0,0), (0,2),   "TOP"),
-            ("SPAN",        (1,0), (1,1)),
-            ("ALIGN",       (1,0), (1,2),   "CENTER"),
-            ("VALIGN",      (1,0), (1,2),   "MIDDLE"),
-            ("FONT",        (1,0), (1,0),   "Helvetica-Bold", 18),
-            ("FONT",        (1,1), (1,2),   "Helvetica-Bold", 14),
-            ("ALIGN",       (2,0), (2,2),   "LEFT"),
-            ("FONT",        (2,0), (2,2),   "Helvetica-Oblique", 12),
-            ("ALIGN",       (3,0), (3,2),   "RIGHT"),
-            ("FONT",        (3,0), (3,2),   "Helvetica", 12),
-            ("LINEBELOW",   (0,2), (-1,2),  2, jaunt_green),
-            ("ALIGN",       (0,3), (0,3),   "LEFT"),
-            ("VALIGN",      (0,3), (0,3),   "TOP"),
-            ("FONT",        (0,3), (0,3),   "Helvetica-BoldOblique", 12),
-            ("SPAN",        (1,3), (-1,3)),
-            ("ALIGN",       (1,3), (-1,3),  "LEFT"),
-            ("FONT",        (1,3), (-1,3),  "Helvetica", 12),
-        ]))
+        header = Table(header_data, colWidths=layout.header_col_widths)
+        header.setStyle(layout.header_style)
         story.append(header)
 
-        # Turnover Materials -- first construct the Table data
-        material_data = [
+        # Turnover Materials -- rows are generated as the Tables are built
+        material_header = [
             ["Turnover Materials", "Description"]
         ]
-        segments = self._segments_by_shot.get(shot["id"]) or []
-        for segment in segments:
-            material_data.append([segment["code"], segment["description"]])
-        for version in (self._versions_by_shot.get(shot["id"]) or []):
-            material_data.append([version["code"], version["description"]])
-        # Add an empty row for nice spacing
-        material_data.append([""]*len(material_data[0]))
-
-        # Specify the Turnover Materials Table column widths
-        col_widths = [half_width]*2
-
-        # Create the Turnover Materials Table and format the cells.
-        materials = Table(material_data, colWidths=col_widths)
-        materials.setStyle(TableStyle([
-            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
-            ("FONT",        (0,0), (-1,0),  "Helvetica-Bold", 12),
-            ("ALIGN",       (0,0), (-1,-1), "LEFT"),
-            ("FONT",        (0,1), (-1,-1), "Helvetica", 10),
-        ]))
-        story.append(materials)
+        material_rows = itertools.chain(
+            ([segment["code"], segment["description"]] for segment in segments),
+            ([version["code"], version["description"]] for version in versions))
+
+        # Create the Turnover Materials Table(s) and format the cells. Adds an
+        # empty row at the end for nice spacing.
+        story.extend(self._chunked_tables(material_header, material_rows,
+            layout.materials_col_widths, layout.materials_style, spacer=True))
 
-        # Editorial Information -- first construct the Table data
-        editorial_data = [
+        # Editorial Information -- rows are generated as the Tables are built
+        editorial_header = [
             ["EDITORIAL", "", "", "", "", ""],
             ["Plate", "Plate Range", "Plate IN", "Plate OUT", "Comp IN", "Comp OUT"],
         ]
-        for segment in segments :
-            editorial_data.append([
-                segment["code"],
-                _float_to_timecode(segment["sg_duration"]),
-                _float_to_timecode(segment["sg_start"]),
-                _float_to_timecode(segment["sg_end"]),
-                segment["sg_timeline_start"],
-                segment["sg_timeline_end"]])
-        # Add an empty row for nice spacing
-        editorial_data.append([""]*len(editorial_data[0]))
-
-        # Specify the Editorial Table column widths
-        col_widths = [half_width] + [content_width/10]*5
-
-        # Create the Editorial Table and format the cells.
-        editorial = Table(editorial_data, colWidths=col_widths)
-        editorial.setStyle(TableStyle([
-            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
-            ("SPAN",        (0,0), (-1,0)),
-            ("FONT",        (0,0), (0,0),   "Helvetica-BoldOblique", 12),
-            ("ALIGN",       (0,0), (1,-1),  "CENTER"),
-            ("ALIGN",       (0,1), (0,1),   "LEFT"), 
-            ("BACKGROUND",  (0,1), (-1,1),  light_grey),
-            ("FONT",        (0,1), (-1,1),  "Helvetica-Bold", 10),
-            ("FONT",        (0,2), (-1,-1), "Helvetica", 10),
-            ("ALIGN",       (0,2), (0,-1),  "LEFT"),
-            ("ALIGN",       (1,2), (-1,-1), "CENTER")
-        ]))
-        story.append(editorial)
 
-        # Notes -- first construct the Notes Table data
-        notes = self._notes_by_shot.get(shot["id"]) or []
-        note_data = [["Notes"]]
-        [note_data.append([safe_para(n["content"], note_style)]) for n in notes]
+        # Create the Editorial Table(s) and format the cells. Adds an empty
+        # row at the end for nice spacing.
+        story.extend(self._chunked_tables(editorial_header, self._editorial_rows(segments),
+            layout.editorial_col_widths, layout.editorial_style, spacer=True))
 
-        # Specify the Notes Table column width(s)
-        col_widths = [content_width]
+        # Notes -- rows are generated as the Tables are built
+        note_header = [["Notes"]]
+        note_rows = ([safe_para(n["content"], layout.note_style)] for n in notes)
 
-        # Create the Notes Table and format the cells.
-        shot_notes = Table(note_data, colWidths=col_widths)
-        shot_notes.setStyle(TableStyle([
-            ("BACKGROUND",  (0,0), (-1,0),  dark_grey),
-            ("FONT",        (0,0), (-1,0),  "Helvetica-BoldOblique", 12),
-            ("ALIGN",       (0,0), (-1,-1), "LEFT"),
-            ("FONT",        (0,1), (-1,-1), "Helvetica", 12),
-        ]))
-        story.append(shot_notes)
+        # Create the Notes Table(s) and format the cells.
+        story.extend(self._chunked_tables(note_header, note_rows,
+            layout.notes_col_widths, layout.notes_style))
 
         # This builds and saves the document to disk.
         doc.build(story, canvasmaker=NumberedCanvas)
+
+
+    def _editorial_rows(self, segments, block_size=500):
+        """
+        Generate the Editorial Table rows for the Segments. The timecode
+        columns are converted a block of Segments at a time.
+
+        :param segments: List of turnover Segments
+        :param block_size: Number of Segments to convert at a time
+        :returns: Generator of Editorial Table rows
+        """
+        format_column = self._timecode.format_column
+        for pos in range(0, len(segments), block_size):
+            block = segments[pos:pos+block_size]
+            for row in zip(
+                    [segment["code"] for segment in block],
+                    format_column([segment["sg_duration"] for segment in block]),
+                    format_column([segment["sg_start"] for segment in block]),
+                    format_column([segment["sg_end"] for segment in block]),
+                    [segment["sg_timeline_start"] for segment in block],
+                    [segment["sg_timeline_end"] for segment in block]):
+                yield list(row)
+
+
+    def _chunked_tables(self, header_rows, rows, col_widths, style, spacer=False):
+        """
+        Build a table as a series of Tables of at most the report's
+        'long_table_rows' setting number of rows each, so a very long table
+        doesn't have to be laid out and split across pages as one huge
+        flowable. Every Table starts with the header rows, which are also
+        repeated when a Table is split across pages.
+
+        :param header_rows: List of header rows
+        :param rows: Iterable of the table rows, consumed one chunk at a time
+        :param col_widths: List of column widths
+        :param style: TableStyle to format each Table with
+        :param spacer: True to add an empty row at the end of the last Table
+        :returns list: The Table flowables
+        """
+        chunk_size = int(self._report_config.get("long_table_rows") or 0)
+        rows = iter(rows)
+        take_chunk = lambda: list(itertools.islice(rows, chunk_size) if chunk_size else rows)
+
+        tables = []
+        chunk = take_chunk()
+        while True:
+            next_chunk = take_chunk() if chunk_size else []
+            table_data = header_rows + chunk
+            if spacer and not next_chunk:
+                table_data.append([""]*len(header_rows[0]))
+            table = Table(table_data, colWidths=col_widths, repeatRows=len(header_rows))
+            table.setStyle(style)
+            tables.append(table)
+            if not next_chunk:
+                return tables
+            chunk = next_chunk
@@ -0,0 +1,589 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Disk backed queue for the movies uploaded to Shotgun after a quickdaily.
+
+Each upload is a JSON job file in the queue directory. Jobs are processed by
+a background worker process, detached from the application which submitted
+them so uploads carry on after it exits. Only one worker runs per queue, it
+uploads a configurable number of movies at the same time, retries failed
+uploads with an exponential backoff and exits once the queue is empty.
+The worker paces everything it sends under a bandwidth cap, as it is sent.
+Movies are uploaded straight to Shotgun, a failed upload starting over on
+its next attempt, unless an upload server is configured, see resumable_upload: movies are then sent to
+it in chunks, and an interrupted transfer resumes from the last chunk the
+server got. A movie whose exact content was already uploaded to the job's
+entity and field, eg. when a job runs again after its upload went through,
+isn't sent again.
+
+The queue can be checked from a shell with:
+
+    python quickdaily_upload_queue.py status <queue directory>
+"""
+
+import errno
+import fcntl
+import hashlib
+import imp
+import json
+import optparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from multiprocessing.pool import ThreadPool
+
+# Loaded from next to this module under a name of its own, both when this is
+# loaded by the upload hook inside Nuke and when it runs as the worker.
+resumable_upload = sys.modules.get("tk_config_resumable_upload") or imp.load_source(
+    "tk_config_resumable_upload",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "resumable_upload.py"))
+
+# Job states.
+QUEUED = "queued"
+UPLOADING = "uploading"
+DONE = "done"
+FAILED = "failed"
+
+# How long finished jobs are kept around for the queue status, in seconds.
+KEEP_FINISHED = 7 * 24 * 3600
+
+# Size of the blocks files are read in when hashing them.
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# Longest the worker sleeps while waiting for a retry, in seconds.
+_MAX_IDLE = 10
+
+CONFIG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_CONFIG_ROOT = os.path.dirname(CONFIG_ROOT)
+
+
+def _jobs_dir(queue_dir):
+    return os.path.join(queue_dir, "jobs")
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def save_job(queue_dir, job):
+    """
+    Write a job to the queue, atomically.
+
+    :param queue_dir: Directory of the queue
+    :param job: Job dictionary
+    """
+    job["updated"] = time.time()
+    job_path = os.path.join(_jobs_dir(queue_dir), "%s.json" % job["id"])
+    temp_path = "%s.%d.tmp" % (job_path, os.getpid())
+    with open(temp_path, "w") as job_file:
+        json.dump(job, job_file, indent=2, sort_keys=True)
+    os.rename(temp_path, job_path)
+
+
+def load_jobs(queue_dir):
+    """
+    Read all the jobs of a queue.
+
+    :param queue_dir: Directory of the queue
+    :returns list: Job dictionaries, oldest first
+    """
+    jobs = []
+    jobs_dir = _jobs_dir(queue_dir)
+    if not os.path.isdir(jobs_dir):
+        return jobs
+    for filename in os.listdir(jobs_dir):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(jobs_dir, filename)) as job_file:
+                jobs.append(json.load(job_file))
+        except (IOError, ValueError):
+            # Being written or removed
+            continue
+    return sorted(jobs, key=lambda job: job["created"])
+
+
+def enqueue(queue_dir, entity_type, entity_id, path, field, max_attempts=5, retry_delay=30, **extra):
+    """
+    Add an upload to the queue.
+
+    :param queue_dir: Directory of the queue
+    :param entity_type: Type of the Shotgun entity to upload to
+    :param entity_id: Id of the Shotgun entity to upload to
+    :param path: Path of the file to upload
+    :param field: Name of the field to upload to
+    :param max_attempts: Number of times the upload is attempted
+    :param retry_delay: Delay before the first retry in seconds, doubled
+                        after each failed attempt
+    :param extra: Any additional values to store in the job
+    :returns dict: The new job
+    """
+    _makedirs(_jobs_dir(queue_dir))
+    now = time.time()
+    job = dict(extra)
+    job.update({
+        "id": "%d_%s" % (now, uuid.uuid4().hex[:8]),
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "path": path,
+        "field": field,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "retry_delay": retry_delay,
+        "next_attempt": now,
+        "created": now,
+        "error": None,
+    })
+    save_job(queue_dir, job)
+    return job
+
+
+def queue_status(queue_dir):
+    """
+    Summarize the state of a queue.
+
+    :param queue_dir: Directory of the queue
+    :returns dict: Number of jobs per state, and the list of jobs under 'jobs'
+    """
+    jobs = load_jobs(queue_dir)
+    status = dict((state, 0) for state in (QUEUED, UPLOADING, DONE, FAILED))
+    for job in jobs:
+        status[job["status"]] += 1
+    status["jobs"] = jobs
+    status["worker_running"] = worker_running(queue_dir)
+    return status
+
+
+def _lock(queue_dir):
+    # Returns the open lock file if the worker lock was acquired, None if
+    # another worker holds it.
+    _makedirs(queue_dir)
+    lock_file = open(os.path.join(queue_dir, "worker.lock"), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _unlock(lock_file):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
+def worker_running(queue_dir):
+    """
+    Check if a worker is processing a queue.
+
+    :param queue_dir: Directory of the queue
+    :returns bool: True if a worker holds the queue lock
+    """
+    lock_file = _lock(queue_dir)
+    if lock_file is None:
+        return True
+    _unlock(lock_file)
+    return False
+
+
+def _python_executable():
+    # Inside an application sys.executable is usually the application itself,
+    # look for the interpreter it ships with instead.
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    candidate = os.path.join(os.path.dirname(sys.executable), "python")
+    if os.path.isfile(candidate):
+        return candidate
+    return "/usr/bin/python"
+
+
+def start_worker(queue_dir, concurrency=2, max_rate=0, dedup=True, log_path=None):
+    """
+    Start a worker for a queue in a detached process, unless one is running
+    already.
+
+    :param queue_dir: Directory of the queue
+    :param concurrency: Number of uploads the worker runs at the same time
+    :param max_rate: Bandwidth cap of the worker's uploads, in bytes per
+                     second, 0 for no cap
+    :param dedup: False to upload every file, even if the same content was
+                  uploaded before
+    :param log_path: File the worker output is appended to, defaults to
+                     worker.log in the queue directory
+    :returns bool: True if a worker was started
+    """
+    if worker_running(queue_dir):
+        return False
+    log_path = log_path or os.path.join(queue_dir, "worker.log")
+    cmd = [_python_executable(), os.path.abspath(__file__).replace(".pyc", ".py"),
+           "work", queue_dir, "--concurrency", str(concurrency), "--max-rate", str(max_rate)]
+    if not dedup:
+        cmd.append("--no-dedup")
+    with open(log_path, "a") as log_file:
+        subprocess.Popen(cmd, stdin=open(os.devnull), stdout=log_file, stderr=subprocess.STDOUT,
+                         close_fds=True, preexec_fn=os.setsid)
+    return True
+
+
+def _due_jobs(jobs, now):
+    return [job for job in jobs if job["status"] == QUEUED and job["next_attempt"] <= now]
+
+
+def _process(queue_dir, job, upload, log):
+    job["status"] = UPLOADING
+    job["attempts"] += 1
+    save_job(queue_dir, job)
+    start_time = time.time()
+    try:
+        result = upload(job)
+        if isinstance(result, dict):
+            job.update(result)
+    except Exception, e:
+        job["error"] = "%s: %s" % (e.__class__.__name__, e)
+        if job["attempts"] >= job["max_attempts"]:
+            job["status"] = FAILED
+            job["finished"] = time.time()
+            log("Giving up on %s after %d attempts: %s" % (job["path"], job["attempts"], job["error"]))
+        else:
+            job["status"] = QUEUED
+            job["next_attempt"] = time.time() + job["retry_delay"] * 2 ** (job["attempts"] - 1)
+            log("Upload of %s failed, retrying in %ds: %s" % (
+                job["path"], job["next_attempt"] - time.time(), job["error"]))
+    else:
+        job["status"] = DONE
+        job["error"] = None
+        job["finished"] = time.time()
+        job["duration"] = job["finished"] - start_time
+        log("Uploaded %s to %s %s in %.1fs" % (
+            job["path"], job["entity_type"], job["entity_id"], job["duration"]))
+    save_job(queue_dir, job)
+
+
+def _prune(queue_dir, jobs, now):
+    for job in jobs:
+        if job["status"] in (DONE, FAILED) and now - job.get("finished", now) > KEEP_FINISHED:
+            try:
+                os.remove(os.path.join(_jobs_dir(queue_dir), "%s.json" % job["id"]))
+            except OSError:
+                pass
+
+
+def run_worker(queue_dir, upload, concurrency=2, log=None):
+    """
+    Process the queue until it is empty. Returns right away if another worker
+    is processing the queue.
+
+    :param queue_dir: Directory of the queue
+    :param upload: Callable uploading the file of the job it is passed, it
+                   may return a dictionary of values to store in the job
+    :param concurrency: Number of uploads to run at the same time
+    :param log: Optional callable to log progress messages with
+    :returns int: Number of upload attempts made
+    """
+    log = log or (lambda msg: None)
+    lock_file = _lock(queue_dir)
+    if lock_file is None:
+        return 0
+    processed = 0
+    pool = ThreadPool(max(1, concurrency))
+    try:
+        # Uploads left in progress by a worker which died are queued again.
+        for job in load_jobs(queue_dir):
+            if job["status"] == UPLOADING:
+                job["status"] = QUEUED
+                save_job(queue_dir, job)
+        while True:
+            now = time.time()
+            jobs = load_jobs(queue_dir)
+            _prune(queue_dir, jobs, now)
+            due = _due_jobs(jobs, now)
+            if due:
+                pool.map(lambda job: _process(queue_dir, job, upload, log), due)
+                processed += len(due)
+                continue
+            waiting = [job["next_attempt"] for job in jobs if job["status"] == QUEUED]
+            if waiting:
+                time.sleep(max(0.1, min(_MAX_IDLE, min(waiting) - now)))
+                continue
+            # Jobs queued while the lock is released are picked up by this
+            # worker if it can get the lock back, or by a new one otherwise.
+            _unlock(lock_file)
+            lock_file = None
+            if not _due_jobs(load_jobs(queue_dir), time.time()):
+                break
+            lock_file = _lock(queue_dir)
+            if lock_file is None:
+                break
+    finally:
+        pool.close()
+        pool.join()
+        if lock_file is not None:
+            _unlock(lock_file)
+    return processed
+
+
+def file_hash(path):
+    """
+    Compute the sha1 hex digest of a file, reading it in blocks so large
+    movies are never held in memory.
+
+    :param path: Path to the file
+    :returns string: Hex digest of the file content
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), ""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadIndex(object):
+    """
+    Local index of the files already uploaded, keyed by the hash of their
+    content, recording the entities and fields they were uploaded to.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path to the JSON file the index is kept in
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as index_file:
+                return json.load(index_file)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, index):
+        temp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp_path, "w") as index_file:
+            json.dump(index, index_file)
+        os.rename(temp_path, self.path)
+
+    def get(self, digest):
+        """
+        :returns list: Records of the uploads of the content with this hash
+        """
+        with self._lock:
+            return self._load().get(digest, [])
+
+    def add(self, digest, record):
+        """
+        Record an upload of the content with this hash.
+
+        :param record: Dictionary with the entity_type, entity_id and field
+                       the content was uploaded to, and the id of the
+                       Attachment if known. It replaces any previous record
+                       for the same entity and field.
+        """
+        key = (record["entity_type"], record["entity_id"], record["field"])
+        with self._lock:
+            index = self._load()
+            records = [r for r in index.get(digest, [])
+                       if (r["entity_type"], r["entity_id"], r["field"]) != key]
+            index[digest] = [record] + records
+            self._save(index)
+
+    def discard(self, digest, record):
+        """
+        Forget an upload which is no longer on Shotgun.
+        """
+        with self._lock:
+            index = self._load()
+            records = [r for r in index.get(digest, []) if r != record]
+            if records:
+                index[digest] = records
+            else:
+                index.pop(digest, None)
+            self._save(index)
+
+
+def _existing_upload(job, digest, index, log):
+    # Returns the values to store in the job if its field already holds an
+    # upload of the same bytes, ie. the job runs again after its upload went
+    # through, or None. Shotgun has no supported call to point a File/Link
+    # field at the upload of another entity, so uploads are only reused for
+    # the entity and field they were made to.
+    target = (job["entity_type"], job["entity_id"], job["field"])
+    for record in index.get(digest):
+        if (record["entity_type"], record["entity_id"], record["field"]) != target:
+            continue
+        existing = _shotgun().find_one(job["entity_type"], [["id", "is", job["entity_id"]]],
+                                       [job["field"]])
+        attachment = existing and existing.get(job["field"])
+        if (not attachment or attachment.get("link_type") != "upload"
+                or attachment.get("id") != record.get("attachment_id", attachment.get("id"))):
+            # Replaced or removed since.
+            index.discard(digest, record)
+            return None
+        log("%s is already uploaded to %s %s as attachment %s, not sending it again" % (
+            job["path"], job["entity_type"], job["entity_id"], attachment["id"]))
+        return {"attachment_id": attachment["id"], "reused_upload": True}
+    return None
+
+
+def upload_job(job, transfers_dir, log=None, index=None):
+    """
+    Upload the file of a job.
+
+    When an index is given, the content of the file is hashed first, and if
+    the same bytes were uploaded to the job's entity and field before and
+    are still there, the upload is skipped.
+
+    Jobs with an upload_url are sent in resumable chunks to that upload
+    server, which attaches the file to the entity and field given in the
+    upload metadata. Other jobs are uploaded straight to Shotgun, in one
+    request, as the user logged in with Toolkit. A failed Shotgun upload
+    can't be resumed, it is sent again from the start when the queue
+    retries the job.
+
+    :param job: Job dictionary
+    :param transfers_dir: Directory the states of chunked transfers are kept in
+    :param log: Optional callable to log progress messages with
+    :param index: Optional UploadIndex of the files already uploaded
+    :returns dict: Values to store in the job, including the transfer stats
+    """
+    log = log or (lambda msg: None)
+    digest = None
+    if index is not None:
+        digest = file_hash(job["path"])
+        result = _existing_upload(job, digest, index, log)
+        if result:
+            result["sha1"] = digest
+            return result
+    result = _upload_job(job, transfers_dir, log)
+    if digest:
+        record = {"entity_type": job["entity_type"], "entity_id": job["entity_id"],
+                  "field": job["field"]}
+        if result.get("attachment_id"):
+            record["attachment_id"] = result["attachment_id"]
+        index.add(digest, record)
+        result["sha1"] = digest
+    return result
+
+
+def _upload_job(job, transfers_dir, log):
+    if job.get("upload_url"):
+        transport = resumable_upload.TusTransport(job["upload_url"])
+        metadata = {
+            "entity_type": job["entity_type"],
+            "entity_id": job["entity_id"],
+            "field": job["field"],
+            "filename": os.path.basename(job["path"]),
+        }
+        (location, stats) = resumable_upload.upload_file(
+            job["path"], transport, os.path.join(transfers_dir, "%s.json" % job["id"]),
+            chunk_size=job.get("chunk_size") or resumable_upload.CHUNK_SIZE,
+            metadata=metadata, log=log)
+        return {"upload_location": location, "transfer": stats.as_dict()}
+
+    stats = resumable_upload.TransferStats(os.path.getsize(job["path"]))
+    attachment_id = _shotgun().upload(job["entity_type"], job["entity_id"], job["path"], job["field"])
+    stats.sent = stats.size
+    stats.chunks = 1
+    stats.finished = time.time()
+    return {"attachment_id": attachment_id, "transfer": stats.as_dict()}
+
+
+_tk = None
+_tk_lock = threading.Lock()
+
+
+def _shotgun():
+    # Shotgun connection of the worker, authenticated with the session saved
+    # by the Toolkit application which submitted the jobs. Toolkit keeps one
+    # connection per thread.
+    global _tk
+    with _tk_lock:
+        if _tk is None:
+            import sgtk
+            user = sgtk.authentication.ShotgunAuthenticator().get_default_user()
+            if user is None:
+                raise RuntimeError("No saved Toolkit session to upload with, log in to Shotgun again")
+            sgtk.set_authenticated_user(user)
+            _tk = sgtk.sgtk_from_path(PIPELINE_CONFIG_ROOT)
+    return _tk.shotgun
+
+
+def _print_status(queue_dir):
+    status = queue_status(queue_dir)
+    print "Worker %s" % ("running" if status["worker_running"] else "stopped")
+    print "%(queued)d queued, %(uploading)d uploading, %(done)d done, %(failed)d failed" % status
+    for job in status["jobs"]:
+        line = "%-10s %s -> %s %s (%d/%d attempts)" % (
+            job["status"], job["path"], job["entity_type"], job["entity_id"],
+            job["attempts"], job["max_attempts"])
+        transfer = job.get("transfer")
+        if job.get("reused_upload"):
+            line += " already uploaded"
+        elif transfer:
+            line += " %.1fMB in %.1fs at %.2fMB/s" % (
+                transfer["size"] / 1048576.0, transfer["elapsed"], transfer["rate"] / 1048576.0)
+            if transfer["resumed_from"]:
+                line += ", resumed at %.1fMB" % (transfer["resumed_from"] / 1048576.0)
+        if job["error"]:
+            line += " %s" % job["error"]
+        print line
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog (work|status) QUEUE_DIR [--concurrency N] [--max-rate B]")
+    parser.add_option("--concurrency", type="int", default=2,
+                      help="Number of uploads to run at the same time")
+    parser.add_option("--max-rate", type="int", default=0,
+                      help="Bandwidth cap of the uploads in bytes per second, 0 for no cap")
+    parser.add_option("--no-dedup", dest="dedup", action="store_false", default=True,
+                      help="Upload every file, even if the same content was uploaded before")
+    (options, args) = parser.parse_args()
+    if len(args) != 2 or args[0] not in ("work", "status"):
+        parser.error("Expected a command, work or status, and a queue directory")
+    (command, queue_dir) = args
+    if command == "status":
+        _print_status(queue_dir)
+        return
+
+    # Use the core this configuration is installed with.
+    sys.path.insert(0, os.path.join(PIPELINE_CONFIG_ROOT, "install", "core", "python"))
+
+    def log(msg):
+        print "%s %s" % (time.strftime("%Y-%m-%d %H:%M:%S"), msg)
+        sys.stdout.flush()
+
+    # The cap is shared by all the uploads of the worker. Shotgun reads and
+    # sends the movies itself, so the bytes are paced as they're written to
+    # the connections.
+    resumable_upload.throttle_http_sends(resumable_upload.Throttle(options.max_rate))
+    transfers_dir = os.path.join(queue_dir, "transfers")
+    index = UploadIndex(os.path.join(queue_dir, "uploaded_index.json")) if options.dedup else None
+
+    def upload(job):
+        return upload_job(job, transfers_dir, log, index)
+
+    try:
+        run_worker(queue_dir, upload, options.concurrency, log)
+    except Exception:
+        log(traceback.format_exc())
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Chunked, resumable file transfers with a bandwidth cap.
+
+Files are sent in chunks to an upload server speaking the tus resumable
+upload protocol (http://tus.io/protocols/resumable-upload.html): the upload is
+created with a POST, its current offset read with a HEAD and chunks appended
+with PATCH requests. The upload url is saved in a state file, so a transfer
+interrupted by a dropped connection, or by the process exiting, carries on
+from the last chunk the server received instead of starting over.
+
+All the transfers of a process can share a Throttle, which caps the total
+bandwidth they use, either chunk by chunk or, with throttle_http_sends(), as
+the bytes of every HTTP request of the process are sent.
+"""
+
+import base64
+import httplib
+import json
+import os
+import threading
+import time
+import urlparse
+
+# Size of the chunks sent in each request, in bytes.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+TUS_VERSION = "1.0.0"
+
+
+class UploadError(Exception):
+    """
+    Raised when the upload server rejects a request.
+    """
+    def __init__(self, message, status=None):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class Throttle(object):
+    """
+    Token bucket capping the rate at which bytes are sent, shared by any
+    number of threads.
+    """
+    def __init__(self, max_rate):
+        """
+        :param max_rate: Maximum rate in bytes per second, 0 for no cap
+        """
+        self.max_rate = max_rate
+        self._lock = threading.Lock()
+        # Start empty, so short transfers don't go over the cap either.
+        self._allowance = 0.0
+        self._last = time.time()
+
+    def consume(self, size):
+        """
+        Wait until size bytes can be sent without going over the cap.
+
+        :param size: Number of bytes about to be sent
+        """
+        if not self.max_rate:
+            return
+        with self._lock:
+            now = time.time()
+            # The bucket holds at most one second worth of bytes.
+            self._allowance = min(float(self.max_rate),
+                                  self._allowance + (now - self._last) * self.max_rate)
+            self._last = now
+            self._allowance -= size
+            wait = -self._allowance / self.max_rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+# Size of the blocks the bytes sent over HTTP connections are paced in.
+_SEND_BLOCK_SIZE = 64 * 1024
+
+
+def throttle_http_sends(throttle):
+    """
+    Pace the bytes sent over every httplib connection of this process under
+    a Throttle, as they are handed to the socket. This covers the clients
+    which read and send a whole file themselves, like the Shotgun API's
+    upload(), which can't be given a throttled file object. It is meant for
+    processes which only upload, like the upload queue worker: requests are
+    all paced, not only the uploads.
+
+    :param throttle: Throttle shared by all the connections
+    """
+    send = httplib.HTTPConnection.send
+
+    def throttled_send(connection, data):
+        if hasattr(data, "read"):
+            blocks = iter(lambda: data.read(_SEND_BLOCK_SIZE), "")
+        else:
+            blocks = (data[pos:pos + _SEND_BLOCK_SIZE]
+                      for pos in xrange(0, len(data), _SEND_BLOCK_SIZE))
+        for block in blocks:
+            throttle.consume(len(block))
+            send(connection, block)
+
+    if throttle.max_rate:
+        httplib.HTTPConnection.send = throttled_send
+
+
+class TransferStats(object):
+    """
+    Statistics of a transfer.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.sent = 0
+        self.resumed_from = 0
+        self.chunks = 0
+        self.retries = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        """
+        Average rate the bytes of this transfer were sent at, in bytes per
+        second.
+        """
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "size": self.size,
+            "sent": self.sent,
+            "resumed_from": self.resumed_from,
+            "chunks": self.chunks,
+            "retries": self.retries,
+            "elapsed": self.elapsed,
+            "rate": self.rate,
+        }
+
+
+class TusTransport(object):
+    """
+    Client for the core tus protocol, one connection per request.
+    """
+    def __init__(self, url, timeout=60, headers=None):
+        """
+        :param url: Url uploads are created at
+        :param timeout: Socket timeout in seconds
+        :param headers: Optional dictionary of extra headers sent with each
+                        request, ie. for authentication
+        """
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def _request(self, method, url, body=None, headers=None):
+        # Urls read back from JSON are unicode, which httplib can't mix with
+        # a binary body.
+        url = urlparse.urljoin(self.url, url)
+        if isinstance(url, unicode):
+            url = url.encode("utf-8")
+        parsed = urlparse.urlparse(url)
+        connection_class = httplib.HTTPSConnection if parsed.scheme == "https" else httplib.HTTPConnection
+        connection = connection_class(parsed.netloc, timeout=self.timeout)
+        try:
+            request_headers = {"Tus-Resumable": TUS_VERSION}
+            request_headers.update(self.headers)
+            request_headers.update(headers or {})
+            path = parsed.path + ("?%s" % parsed.query if parsed.query else "")
+            connection.request(method, path, body, request_headers)
+            response = connection.getresponse()
+            response.read()
+            return response
+        finally:
+            connection.close()
+
+    def create(self, size, metadata=None):
+        """
+        Create an upload.
+
+        :param size: Size of the file to upload, in bytes
+        :param metadata: Optional dictionary of strings sent along
+        :returns: Url of the new upload
+        """
+        headers = {"Upload-Length": str(size)}
+        if metadata:
+            headers["Upload-Metadata"] = ",".join(
+                "%s %s" % (key, base64.b64encode(str(value)))
+                for (key, value) in sorted(metadata.iteritems()))
+        response = self._request("POST", self.url, headers=headers)
+        if response.status != 201 or not response.getheader("Location"):
+            raise UploadError("Unable to create upload: %s %s" % (response.status, response.reason),
+                              response.status)
+        return urlparse.urljoin(self.url, response.getheader("Location"))
+
+    def offset(self, location):
+        """
+        Get the number of bytes of an upload the server received.
+
+        :param location: Url of the upload
+        :returns: The offset, or None if the server doesn't know the upload
+        """
+        response = self._request("HEAD", location)
+        if response.status in (403, 404, 410):
+            return None
+        if response.status != 200:
+            raise UploadError("Unable to get upload offset: %s %s" % (response.status, response.reason),
+                              response.status)
+        return int(response.getheader("Upload-Offset"))
+
+    def send(self, location, offset, data):
+        """
+        Append a chunk to an upload.
+
+        :param location: Url of the upload
+        :param offset: Offset of the chunk in the file
+        :param data: Content of the chunk
+        :returns: The new offset of the upload
+        """
+        headers = {
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream",
+        }
+        response = self._request("PATCH", location, data, headers)
+        if response.status != 204:
+            raise UploadError("Unable to send chunk at %d: %s %s" % (offset, response.status, response.reason),
+                              response.status)
+        return int(response.getheader("Upload-Offset"))
+
+
+def _load_state(state_path, path):
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except (IOError, ValueError):
+        return None
+    # A file changed since the transfer started is sent again from scratch.
+    stat = os.stat(path)
+    if state.get("path") != path or state.get("size") != stat.st_size or state.get("mtime") != stat.st_mtime:
+        return None
+    return state
+
+
+def _save_state(state_path, state):
+    state_dir = os.path.dirname(state_path)
+    if state_dir and not os.path.isdir(state_dir):
+        os.makedirs(state_dir)
+    temp_path = "%s.%d" % (state_path, os.getpid())
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.rename(temp_path, state_path)
+
+
+def upload_file(path, transport, state_path, chunk_size=CHUNK_SIZE, throttle=None,
+                retries=5, retry_delay=2, metadata=None, log=None):
+    """
+    Send a file in chunks, resuming an earlier transfer of the same file
+    recorded in the state file if the server still has it.
+
+    A failed chunk is retried after reading back the offset the server got
+    to, with a delay doubling after each consecutive failure.
+
+    :param path: Path of the file to send
+    :param transport: TusTransport, or any object with the same methods
+    :param state_path: Path of the file the transfer state is kept in, it is
+                       removed once the transfer completes
+    :param chunk_size: Size of the chunks to send, in bytes
+    :param throttle: Optional Throttle to cap the bandwidth with
+    :param retries: Number of consecutive failures before giving up
+    :param retry_delay: Delay before the first retry, in seconds
+    :param metadata: Optional dictionary of strings sent when creating the
+                     upload
+    :param log: Optional callable to log progress messages with
+    :returns: (upload url, TransferStats) tuple
+    """
+    log = log or (lambda msg: None)
+    stat = os.stat(path)
+    stats = TransferStats(stat.st_size)
+
+    state = _load_state(state_path, path)
+    offset = transport.offset(state["location"]) if state else None
+    if offset is None:
+        location = transport.create(stat.st_size, metadata)
+        _save_state(state_path, {"path": path, "size": stat.st_size, "mtime": stat.st_mtime,
+                                 "location": location})
+        offset = 0
+    else:
+        location = state["location"]
+        stats.resumed_from = offset
+        log("Resuming upload of %s at %d/%d bytes" % (path, offset, stat.st_size))
+
+    failures = 0
+    with open(path, "rb") as source:
+        while offset < stat.st_size:
+            source.seek(offset)
+            data = source.read(chunk_size)
+            if throttle:
+                throttle.consume(len(data))
+            try:
+                new_offset = transport.send(location, offset, data)
+            except Exception, e:
+                failures += 1
+                stats.retries += 1
+                if failures > retries:
+                    raise
+                delay = retry_delay * 2 ** (failures - 1)
+                log("Chunk at %d of %s failed, retrying in %ds: %s" % (offset, path, delay, e))
+                time.sleep(delay)
+                # Part of the chunk may have made it.
+                new_offset = transport.offset(location)
+                if new_offset is None:
+                    raise UploadError("Upload %s expired on the server" % location)
+            else:
+                failures = 0
+                stats.chunks += 1
+            stats.sent += new_offset - offset
+            offset = new_offset
+
+    stats.finished = time.time()
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+    return (location, stats)
@@ -0,0 +1,118 @@
+# Copyright (c) 2015 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hook that copies files for the tk-multi-snapshot app.
+
+The script is read when the snapshot is taken, so the snapshot holds it as it
+was then, but it is written to the snapshot folder in the background, so the
+artist doesn't wait on the network storage. When a snapshot is identical to
+one already in the snapshot folder, ie. the script didn't change since the
+last snapshot, the new snapshot is a hard link to the existing file instead
+of another copy.
+"""
+
+import hashlib
+import os
+import threading
+
+from tank import Hook
+
+# Size of the blocks files are read in when comparing them.
+_BLOCK_SIZE = 1024 * 1024
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), ""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotCopyFile(Hook):
+
+    def execute(self, source_path, target_path, **kwargs):
+        """
+        Read a file, then copy it, or hard link an identical file of the
+        target folder, from a background thread.
+
+        :param source_path: Path of the file to copy
+        :param target_path: Path to copy the file to
+        :returns: The thread writing the snapshot
+        """
+        # create the folder if it doesn't exist
+        dirname = os.path.dirname(target_path)
+        if not os.path.isdir(dirname):
+            old_umask = os.umask(0)
+            os.makedirs(dirname, 0777)
+            os.umask(old_umask)
+
+        with open(source_path, "rb") as source_file:
+            content = source_file.read()
+        mode = os.stat(source_path).st_mode
+
+        # Not a daemon, so the snapshot is still written if the application
+        # exits meanwhile.
+        thread = threading.Thread(target=self._write_snapshot,
+                                  args=(content, mode, target_path),
+                                  name="snapshot_copy_file")
+        thread.start()
+        return thread
+
+    def _write_snapshot(self, content, mode, target_path):
+        try:
+            identical_path = self._find_identical(content, os.path.dirname(target_path),
+                                                  os.path.splitext(target_path)[1])
+            if identical_path:
+                try:
+                    os.link(identical_path, target_path)
+                    self._log("log_debug", "Linked %s to identical %s" % (target_path, identical_path))
+                    return
+                except OSError, e:
+                    self._log("log_debug", "Unable to link %s, copying it: %s" % (identical_path, e))
+
+            # Write under a temporary name first, so an interrupted copy never
+            # looks like a snapshot.
+            temp_path = "%s.%d.tmp" % (target_path, os.getpid())
+            with open(temp_path, "wb") as temp_file:
+                temp_file.write(content)
+            os.chmod(temp_path, mode & 07777)
+            os.rename(temp_path, target_path)
+        except Exception, e:
+            self._log("log_warning", "Unable to write snapshot %s: %s" % (target_path, e))
+
+    def _log(self, level, msg):
+        # The engine logs through the application, from its main thread.
+        self.parent.engine.async_execute_in_main_thread(getattr(self.parent, level), msg)
+
+    def _find_identical(self, content, dirname, extension):
+        """
+        Find a file of a folder with the given content and extension, looking
+        at the most recent files of the same size first.
+
+        :returns: Path of the identical file, or None
+        """
+        candidates = []
+        for filename in os.listdir(dirname):
+            path = os.path.join(dirname, filename)
+            if not filename.endswith(extension) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            if stat.st_size == len(content):
+                candidates.append((stat.st_mtime, path))
+        if not candidates:
+            return None
+
+        content_hash = hashlib.sha1(content).hexdigest()
+        for (mtime, path) in sorted(candidates, reverse=True):
+            if _file_hash(path) == content_hash:
+                return path
+        return None
@@ -12,19 +12,25 @@ from tank import Hook
 from tank import TankError
 
 class SnapshotHistoryPostQuickdaily(Hook):
+    """
+    Snapshots the script after a quickdaily. The script is read before
+    returning, so the snapshot holds it as it was rendered, then written in
+    the background, unchanged scripts being hard linked rather than copied
+    (see snapshot_copy_file).
+    """
 
     def execute(self, mov_path, version_id, comments, **kwargs):
         app = self.parent
         # get app
         snapshot_app = app.engine.apps["tk-multi-snapshot"]
+        comment = "Automatically snapshotted after Quickdaily. "
+        comment += "User Comments: %s " % comments
+        comment += "Version id: %d " % version_id
+        comment += "Quicktime: %s" % mov_path
         # try to snapshot the file and add a comment
         try:
-            comment = "Automatically snapshotted after Quickdaily. "
-            comment += "User Comments: %s " % comments
-            comment += "Version id: %d " % version_id
-            comment += "Quicktime: %s" % mov_path
-            snapshot_app.snapshot(comment)
-        except TankError:
-            app.log_warning("Unable to snapshot movie to shotgun: %s" % e)
+            snapshot_path = snapshot_app.snapshot(comment)
+            app.log_debug("Snapshotted to %s" % snapshot_path)
+        except TankError, e:
             # fine, means file wasn't a proper snapshot
-            pass
+            app.log_warning("Unable to snapshot script after Quickdaily: %s" % e)
@@ -0,0 +1,76 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Helpers shared by the batch scripts run against a list of Shots: the paths
+of this configuration, the Shotgun authentication and the selection of the
+Shots from the command line options.
+
+Importing this module puts the core this configuration is installed with on
+the path, so sgtk can be imported after it.
+"""
+
+import json
+import os
+import sys
+
+CONFIG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_CONFIG_ROOT = os.path.dirname(CONFIG_ROOT)
+
+# Use the core this configuration is installed with.
+sys.path.insert(0, os.path.join(PIPELINE_CONFIG_ROOT, "install", "core", "python"))
+import sgtk
+
+
+def add_shot_options(parser):
+    """
+    Add the options selecting the Shots and authenticating to a parser.
+
+    :param parser: optparse.OptionParser of the script
+    """
+    parser.add_option("--project-id", type="int", help="Id of the Project the Shots belong to")
+    parser.add_option("--ids", help="Comma separated Shot ids")
+    parser.add_option("--ids-file", help="File with one Shot id per line")
+    parser.add_option("--filters", help="Saved query, as a JSON list of Shot filters")
+    parser.add_option("--script-name", help="Shotgun script user to authenticate as")
+    parser.add_option("--script-key", help="Application key of the Shotgun script user")
+    parser.add_option("--host", help="Shotgun site url, when authenticating as a script user")
+
+
+def find_shot_ids(tk, project_id, options):
+    """
+    Gather the Shot ids to run against from the command line options.
+
+    :returns list: The Shot ids
+    """
+    ids = []
+    if options.ids:
+        ids.extend(int(i) for i in options.ids.split(",") if i.strip())
+    if options.ids_file:
+        with open(options.ids_file) as ids_file:
+            ids.extend(int(line) for line in ids_file if line.strip())
+    if options.filters:
+        filters = [["project", "is", {"type": "Project", "id": project_id}]]
+        filters.extend(json.loads(options.filters))
+        ids.extend(shot["id"] for shot in tk.shotgun.find("Shot", filters, ["id"]))
+    return ids
+
+
+def authenticate(options):
+    """
+    Authenticate as the given script user, or as the current user otherwise.
+    """
+    authenticator = sgtk.authentication.ShotgunAuthenticator()
+    if options.script_name:
+        user = authenticator.create_script_user(
+            options.script_name, options.script_key, options.host)
+    else:
+        user = authenticator.get_user()
+    sgtk.set_authenticated_user(user)
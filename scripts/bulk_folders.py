@@ -0,0 +1,109 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Creates the folders of core/schema/project for many Shots at once.
+
+Toolkit creates folders one entity at a time when they are created from the
+applications, which is slow on network storage when a turnover brings
+hundreds of Shots in. Here, the Shots are handed to Toolkit's folder creation
+in batches, so for each batch the schema is processed once for all its Shots,
+the whole set of folders is passed to the process_folder_creation core hook
+in one call, and the new entity folders are recorded in the path cache in one
+Shotgun batch. The core hook of this configuration lists each parent folder
+once to leave out what already exists, and creates the rest in parallel, see
+core/hooks/process_folder_creation.py.
+
+Usage:
+
+    python bulk_folders.py --project-id 123 \\
+        (--ids 1,2,3 | --ids-file ids.txt | --filters '[["sg_status_list", "is", "ip"]]') \\
+        [--batch-size 50] [--dry-run] [--script-name NAME --script-key KEY]
+"""
+
+import optparse
+import time
+
+# batch_common puts the core this configuration is installed with on the path.
+from batch_common import PIPELINE_CONFIG_ROOT, add_shot_options, authenticate, find_shot_ids
+import sgtk
+
+
+def batches(ids, batch_size):
+    """
+    Split the ids in batches.
+
+    :param ids: Ids to split
+    :param batch_size: Largest number of ids in a batch
+    :returns list: Lists of ids
+    """
+    batch_size = max(1, batch_size)
+    return [ids[pos:pos + batch_size] for pos in range(0, len(ids), batch_size)]
+
+
+def create_folders(tk, shot_ids, batch_size, preview=False, log=None):
+    """
+    Create the folders of Shots through Toolkit, a batch of Shots at a time.
+
+    :param tk: Toolkit API instance for this configuration
+    :param shot_ids: Ids of the Shots to create the folders of
+    :param batch_size: Number of Shots passed to Toolkit at once
+    :param preview: True to only list the folders Toolkit would create
+    :param log: Optional callable to log progress messages with
+    :returns: Number of folders created, or the list of the paths that would
+              be created in preview mode
+    """
+    log = log or (lambda msg: None)
+    created = [] if preview else 0
+    for (index, batch) in enumerate(batches(shot_ids, batch_size)):
+        start_time = time.time()
+        if preview:
+            created.extend(tk.preview_filesystem_structure("Shot", batch))
+        else:
+            created += tk.create_filesystem_structure("Shot", batch)
+        log("Batch %d: %d Shots in %.2fs" % (index + 1, len(batch), time.time() - start_time))
+    return created
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_shot_options(parser)
+    parser.add_option("--batch-size", type="int", default=50,
+                      help="Number of Shots passed to Toolkit at once")
+    parser.add_option("--dry-run", action="store_true", default=False,
+                      help="Print what would be created without creating it")
+    (options, args) = parser.parse_args()
+    if not options.project_id:
+        parser.error("--project-id is required")
+    if not (options.ids or options.ids_file or options.filters):
+        parser.error("One of --ids, --ids-file or --filters is required")
+
+    authenticate(options)
+    tk = sgtk.sgtk_from_path(PIPELINE_CONFIG_ROOT)
+    shot_ids = sorted(set(find_shot_ids(tk, options.project_id, options)))
+    if not shot_ids:
+        print("No Shots to create folders for")
+        return
+
+    def log(msg):
+        print(msg)
+
+    start_time = time.time()
+    created = create_folders(tk, shot_ids, options.batch_size, options.dry_run, log)
+    if options.dry_run:
+        for path in created:
+            print(path)
+        print("%d Shots: %d folders would be created" % (len(shot_ids), len(created)))
+    else:
+        print("%d Shots: %d folders created in %.2fs" % (len(shot_ids), created, time.time() - start_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Checks that the frames of the Nuke renders are complete, for both eyes.
+
+The frames written with the nuke_shot_render_mono_exr template, one file per
+eye like '{Shot}_{nuke_name}_{eye}_v{version}.{SEQ}.exr', and with the
+nuke_shot_render_stereo_exr template, both eyes in one file, are found
+through the templates of this configuration. Each render folder is listed
+once. The first file of each eye of a version is matched by Toolkit, and the
+others by a regular expression of that file name with the frame number left
+open, so Toolkit isn't asked about every frame. Only files laid out the way
+the templates say are found, so the folders given must be render folders of
+the project, or folders above them with --recursive. The frames of each eye are
+kept in a FrameSet, one byte per frame, so folders with hundreds of
+thousands of frames don't turn into as many objects.
+
+For each rendered version the frames missing from each eye, the zero-byte
+frames, and the frames rendered for only one of the L and R eyes are
+reported. The expected frame range is the range covered by all the eyes,
+unless --first and --last are given. Frames far from the others, or far
+outside of --first and --last, like a mis-padded frame number, are reported
+as stray instead of stretching the range.
+
+Usage:
+
+    python render_scan.py [--recursive] [--first 1001 --last 1240] \\
+        [--no-sizes] [--json] FOLDER [FOLDER ...]
+"""
+
+import array
+import itertools
+import json
+import operator
+import optparse
+import os
+import re
+import sys
+
+# batch_common puts the core this configuration is installed with on the path.
+from batch_common import PIPELINE_CONFIG_ROOT
+import sgtk
+
+RENDER_TEMPLATES = ["nuke_shot_render_mono_exr", "nuke_shot_render_stereo_exr"]
+
+# Keys of the frame number and of the eye in the render templates.
+SEQ_KEY = "SEQ"
+EYE_KEY = "eye"
+
+_FRAME_SPEC_RE = re.compile(r"%0?(\d*)d")
+
+PRESENT = 1
+EMPTY = 2
+
+# Frames further than this from the other frames of an eye, or from the
+# expected range, are stray, ie. a mis-padded 10010001 next to 1001-1240.
+MAX_GAP = 10000
+
+# Size of the blocks frames are counted in to find the stray ones.
+_BLOCK_SIZE = 1000
+
+
+class RenderScanError(Exception):
+    """
+    Raised when the render templates can't be used.
+    """
+
+
+def _kept_range(frames, first=None, last=None):
+    # Range of the frames which aren't stray: around the expected range if
+    # given, the cluster of blocks holding the most frames otherwise.
+    if first is not None and last is not None:
+        return (first - MAX_GAP, last + MAX_GAP)
+    counts = {}
+    for frame in frames:
+        block = frame // _BLOCK_SIZE
+        counts[block] = counts.get(block, 0) + 1
+    clusters = []
+    for block in sorted(counts):
+        if clusters and (block - clusters[-1][1]) * _BLOCK_SIZE <= MAX_GAP:
+            clusters[-1][1] = block
+            clusters[-1][2] += counts[block]
+        else:
+            clusters.append([block, block, counts[block]])
+    (low, high, count) = max(clusters, key=operator.itemgetter(2))
+    return (low * _BLOCK_SIZE, (high + 1) * _BLOCK_SIZE - 1)
+
+
+class FrameSet(object):
+    """
+    Frames of one eye of a rendered version.
+
+    Frames are collected as they are added, in whatever order the folder is
+    listed in, then laid out by build, one byte per frame from the first one
+    to the last one. Frames far from the others are kept apart as stray
+    frames, so a single mis-numbered file doesn't stretch the set over
+    millions of frames.
+    """
+    __slots__ = ("first", "stray", "_flags", "_present", "_empty")
+
+    def __init__(self):
+        self.first = None
+        self.stray = []
+        self._flags = bytearray()
+        # Frames added since the last build
+        self._present = array.array("l")
+        self._empty = array.array("l")
+
+    def add(self, frame, empty=False):
+        """
+        Add a frame, see build.
+
+        :param frame: Frame number
+        :param empty: True if the frame file is zero bytes
+        """
+        (self._empty if empty else self._present).append(frame)
+
+    def build(self, first=None, last=None):
+        """
+        Lay out the frames added, along with the ones laid out before. Must
+        be called before looking at the frames of the set.
+
+        :param first: First frame expected, see last
+        :param last: Last frame expected. When both are given, the frames
+                     more than MAX_GAP frames outside of them are stray,
+                     otherwise the ones more than MAX_GAP frames away from
+                     the bulk of the frames are
+        """
+        if self._flags or self.stray:
+            self._present.extend(self.frames(PRESENT))
+            self._present.extend(self.stray)
+            self._empty.extend(self.frames(EMPTY))
+        self.first = None
+        self.stray = []
+        self._flags = bytearray()
+        if not self._present and not self._empty:
+            return
+
+        (low, high) = _kept_range(itertools.chain(self._present, self._empty), first, last)
+        (kept_first, kept_last) = (None, None)
+        for frame in itertools.chain(self._present, self._empty):
+            if low <= frame <= high:
+                if kept_first is None or frame < kept_first:
+                    kept_first = frame
+                if kept_last is None or frame > kept_last:
+                    kept_last = frame
+            else:
+                self.stray.append(frame)
+        self.stray.sort()
+
+        if kept_first is not None:
+            self.first = kept_first
+            self._flags = bytearray(kept_last - kept_first + 1)
+            for (frames, flag) in ((self._present, PRESENT), (self._empty, EMPTY)):
+                for frame in frames:
+                    if kept_first <= frame <= kept_last:
+                        self._flags[frame - kept_first] = flag
+        self._present = array.array("l")
+        self._empty = array.array("l")
+
+    @property
+    def last(self):
+        return self.first + len(self._flags) - 1 if self._flags else None
+
+    def __len__(self):
+        return len(self._flags) - self._flags.count(b"\x00")
+
+    def __contains__(self, frame):
+        index = frame - self.first if self.first is not None else -1
+        return 0 <= index < len(self._flags) and self._flags[index] != 0
+
+    def frames(self, flag=None):
+        """
+        :param flag: PRESENT or EMPTY to only get these frames, None for all
+        :returns: Generator of the frame numbers, in order, stray frames left out
+        """
+        for (index, value) in enumerate(self._flags):
+            if value and (flag is None or value == flag):
+                yield self.first + index
+
+    def missing(self, first, last):
+        """
+        :returns: Generator of the frames from first to last not in the set
+        """
+        for frame in xrange(first, last + 1):
+            if frame not in self:
+                yield frame
+
+
+def frame_ranges(frames):
+    """
+    Compact frame numbers into ranges.
+
+    :param frames: Frame numbers, in order
+    :returns list: 'first-last' or 'frame' strings
+    """
+    ranges = []
+    start = previous = None
+    for frame in frames:
+        if previous is not None and frame == previous + 1:
+            previous = frame
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == previous else "%d-%d" % (start, previous))
+        start = previous = frame
+    if start is not None:
+        ranges.append(str(start) if start == previous else "%d-%d" % (start, previous))
+    return ranges
+
+
+class _Matcher(object):
+    # Pattern of the frame files of one eye of a rendered version.
+    __slots__ = ("regex", "render_key", "eye")
+
+    def __init__(self, regex, render_key, eye):
+        self.regex = regex
+        self.render_key = render_key
+        self.eye = eye
+
+
+def load_render_templates(tk, names=RENDER_TEMPLATES):
+    """
+    Get the render templates of the configuration.
+
+    :param tk: Toolkit API instance for this configuration
+    :param names: Names of the templates, the files of a folder are matched
+                  against them in this order
+    :returns list: TemplatePath for each name
+    """
+    render_templates = []
+    for name in names:
+        template = tk.templates.get(name)
+        if template is None:
+            raise RenderScanError("No template named %s" % name)
+        if SEQ_KEY not in template.keys:
+            raise RenderScanError("Template %s has no {%s} key" % (name, SEQ_KEY))
+        render_templates.append(template)
+    return render_templates
+
+
+def _matcher_for(path, render_templates):
+    # Match a file with Toolkit, and turn what it found into a pattern for
+    # the other frames of the same eye of the same version: its name with
+    # the frame number left open.
+    for template in render_templates:
+        if not template.validate(path):
+            continue
+        fields = template.get_fields(path)
+        # The sequence key gives the spec its padding, ie. %04d.
+        file_name = os.path.basename(template.apply_fields(dict(fields, **{SEQ_KEY: "FORMAT: %d"})))
+        frame_spec = _FRAME_SPEC_RE.search(file_name)
+        if frame_spec is None:
+            continue
+        regex = re.compile(r"^%s(\d{%d,})%s$" % (
+            re.escape(file_name[:frame_spec.start()]), int(frame_spec.group(1) or 1),
+            re.escape(file_name[frame_spec.end():])))
+        values = tuple(sorted((k, v) for (k, v) in fields.iteritems() if k not in (SEQ_KEY, EYE_KEY)))
+        return _Matcher(regex, (template.name, values), fields.get(EYE_KEY, ""))
+    return None
+
+
+def scan_folder(folder, render_templates, file_names=None, check_sizes=True):
+    """
+    Gather the frames of the renders in a folder.
+
+    :param folder: Folder to scan
+    :param render_templates: List of TemplatePath to match the files with
+    :param file_names: Names of the files in the folder, if already listed
+    :param check_sizes: False to skip looking for zero-byte frames
+    :returns: (dictionary of (template name, ((key, value), ...)) ->
+              dictionary of eye -> FrameSet, number of files matching no
+              template) tuple, the eye of the frames with both eyes in one
+              file being ''
+    """
+    folder = os.path.abspath(folder)
+    if file_names is None:
+        file_names = os.listdir(folder)
+    matchers = []
+    renders = {}
+    unmatched = 0
+    for file_name in file_names:
+        for matcher in matchers:
+            match = matcher.regex.match(file_name)
+            if match:
+                break
+        else:
+            # First frame of an eye of a version, or a file of no render.
+            matcher = _matcher_for(os.path.join(folder, file_name), render_templates)
+            match = matcher and matcher.regex.match(file_name)
+            if not match:
+                unmatched += 1
+                continue
+            matchers.append(matcher)
+        eyes = renders.get(matcher.render_key)
+        if eyes is None:
+            eyes = renders[matcher.render_key] = {}
+        frame_set = eyes.get(matcher.eye)
+        if frame_set is None:
+            frame_set = eyes[matcher.eye] = FrameSet()
+        empty = check_sizes and os.lstat(os.path.join(folder, file_name)).st_size == 0
+        frame_set.add(int(match.group(1)), empty)
+    for eyes in renders.itervalues():
+        for frame_set in eyes.itervalues():
+            frame_set.build()
+    return (renders, unmatched)
+
+
+def check_render(eyes, first=None, last=None):
+    """
+    Check the frames of a rendered version.
+
+    :param eyes: Dictionary of eye -> FrameSet
+    :param first: First frame expected, the first frame of all the eyes if
+                  None
+    :param last: Last frame expected, the last frame of all the eyes if None
+    :returns dict: The range checked, and per eye its frame count, missing,
+                   zero-byte and stray frames as ranges, plus the frames
+                   only rendered for the L or R eye
+    """
+    if first is not None and last is not None:
+        # Frames far outside of the expected range are stray.
+        for frame_set in eyes.values():
+            frame_set.build(first, last)
+    built = [f for f in eyes.values() if f.first is not None]
+    first = min(f.first for f in built) if first is None else first
+    last = max(f.last for f in built) if last is None else last
+    report = {"first": first, "last": last, "eyes": {}, "complete": True}
+    for (eye, frame_set) in sorted(eyes.iteritems()):
+        missing = frame_ranges(frame_set.missing(first, last))
+        empty = frame_ranges(frame_set.frames(EMPTY))
+        stray = frame_ranges(frame_set.stray)
+        report["eyes"][eye] = {"frames": len(frame_set), "missing": missing, "empty": empty,
+                               "stray": stray}
+        if missing or empty or stray:
+            report["complete"] = False
+    # Stereo renders written one file per eye need both eyes.
+    if "L" in eyes or "R" in eyes:
+        left = eyes.get("L") or FrameSet()
+        right = eyes.get("R") or FrameSet()
+        report["left_only"] = frame_ranges(f for f in left.frames() if f not in right)
+        report["right_only"] = frame_ranges(f for f in right.frames() if f not in left)
+        if report["left_only"] or report["right_only"]:
+            report["complete"] = False
+    return report
+
+
+def scan(folders, render_templates, recursive=False, first=None, last=None, check_sizes=True):
+    """
+    Scan render folders and check the versions found in them.
+
+    :param folders: Folders to scan
+    :param render_templates: List of TemplatePath to match the files with
+    :param recursive: True to scan the folders under them too
+    :param first: First frame expected, see check_render
+    :param last: Last frame expected, see check_render
+    :param check_sizes: False to skip looking for zero-byte frames
+    :returns list: Report of each rendered version found, see check_render,
+                   with its folder, template and key values
+    """
+    reports = []
+
+    def scan_one(folder, file_names=None):
+        (renders, unmatched) = scan_folder(folder, render_templates, file_names, check_sizes)
+        for ((name, values), eyes) in sorted(renders.iteritems()):
+            report = check_render(eyes, first, last)
+            report.update({"folder": folder, "template": name, "unmatched": unmatched,
+                           "keys": dict(values)})
+            reports.append(report)
+
+    for folder in folders:
+        if not recursive:
+            scan_one(folder)
+            continue
+        # os.walk lists each folder once, its file names are used as is.
+        for (path, dir_names, file_names) in os.walk(folder):
+            dir_names.sort()
+            scan_one(path, file_names)
+    return reports
+
+
+def print_reports(reports):
+    for report in reports:
+        keys = ", ".join("%s=%s" % item for item in sorted(report["keys"].items()))
+        print("%s %s [%s] frames %d-%d: %s" % (
+            report["folder"], report["template"], keys, report["first"], report["last"],
+            "complete" if report["complete"] else "INCOMPLETE"))
+        for (eye, result) in sorted(report["eyes"].items()):
+            print("    eye %-5s %7d frames%s%s%s" % (
+                eye or "both", result["frames"],
+                "  missing %s" % ",".join(result["missing"]) if result["missing"] else "",
+                "  zero-byte %s" % ",".join(result["empty"]) if result["empty"] else "",
+                "  stray %s" % ",".join(result["stray"]) if result["stray"] else ""))
+        if report.get("left_only"):
+            print("    only in L: %s" % ",".join(report["left_only"]))
+        if report.get("right_only"):
+            print("    only in R: %s" % ",".join(report["right_only"]))
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] FOLDER [FOLDER ...]")
+    parser.add_option("--recursive", action="store_true", default=False,
+                      help="Scan the folders under the given ones too")
+    parser.add_option("--first", type="int", help="First frame expected")
+    parser.add_option("--last", type="int", help="Last frame expected")
+    parser.add_option("--no-sizes", dest="check_sizes", action="store_false", default=True,
+                      help="Don't look for zero-byte frames, which needs a stat per frame")
+    parser.add_option("--templates", default=",".join(RENDER_TEMPLATES),
+                      help="Comma separated render templates to match")
+    parser.add_option("--json", action="store_true", default=False, help="Print the reports as JSON")
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("Expected at least one folder")
+
+    tk = sgtk.sgtk_from_path(PIPELINE_CONFIG_ROOT)
+    render_templates = load_render_templates(
+        tk, names=[n.strip() for n in options.templates.split(",") if n.strip()])
+    reports = scan(args, render_templates, options.recursive, options.first, options.last, options.check_sizes)
+    if options.json:
+        print(json.dumps(reports, indent=2, sort_keys=True))
+    else:
+        print_reports(reports)
+    return 0 if all(r["complete"] for r in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Finds the templates of this configuration a path matches, without asking
+Toolkit about all of them one by one.
+
+The path templates are indexed in a trie of their path segments, built once
+from their definitions, with their optional '[...]' sections expanded into
+one variant with and one without each section. A segment with no keys, like
+'renders', is a plain lookup, a segment with keys, like
+'{Shot}_{nuke_name}_{eye}_v{version}.{SEQ}.exr', is checked against its text
+with each key matching anything. Walking a path down the trie narrows the
+candidates to the few templates with the same layout, and only these are
+given the path to validate, so the values of the keys, their types, choices
+and filters, and the keys used more than once, like {Shot} and {version},
+are checked by Toolkit itself.
+
+Usage:
+
+    python template_index.py PATH [PATH ...]
+"""
+
+import optparse
+import os
+import re
+
+# batch_common puts the core this configuration is installed with on the path.
+from batch_common import PIPELINE_CONFIG_ROOT
+import sgtk
+
+_KEY_RE = re.compile(r"{[^}]+}")
+_OPTIONAL_RE = re.compile(r"\[([^\[\]]*)\]")
+
+# Number of folders whose trie nodes are kept between lookups.
+FOLDER_CACHE_SIZE = 4096
+
+
+def _expand_optional(definition):
+    # One definition per combination of the optional sections.
+    match = _OPTIONAL_RE.search(definition)
+    if not match:
+        return [definition]
+    head = definition[:match.start()]
+    return [head + section + tail
+            for tail in _expand_optional(definition[match.end():])
+            for section in (match.group(1), "")]
+
+
+def _segment_pattern(segment):
+    # Text of the segment, each key matching anything.
+    parts = [re.escape(text) for text in _KEY_RE.split(segment)]
+    return re.compile("^%s$" % ".*?".join(parts), re.DOTALL)
+
+
+def _normpath(path):
+    return path.replace("\\", "/").rstrip("/")
+
+
+class _Node(object):
+    __slots__ = ("literals", "keyed", "templates")
+
+    def __init__(self):
+        # Segment -> child node
+        self.literals = {}
+        # Segment with keys -> (compiled pattern, child node)
+        self.keyed = {}
+        # Names of the templates ending at this node
+        self.templates = set()
+
+
+class TemplateIndex(object):
+    """
+    Trie of the path segments of the path templates of a configuration,
+    under each of their storage roots.
+    """
+    def __init__(self, templates):
+        """
+        :param templates: Dictionary of template name -> template, like
+                          tk.templates. Only the path templates are indexed.
+        """
+        self.templates = templates
+        self.node_count = 0
+        self._roots = {}
+        self._folders = {}
+        patterns = {}
+        for (name, template) in sorted(templates.iteritems()):
+            if not isinstance(template, sgtk.TemplatePath):
+                continue
+            root = _normpath(template.root_path)
+            if root not in self._roots:
+                self._roots[root] = _Node()
+                self.node_count += 1
+            for definition in _expand_optional(template.definition):
+                node = self._roots[root]
+                for segment in _normpath(definition).split("/"):
+                    if not segment:
+                        continue
+                    if "{" not in segment:
+                        child = node.literals.get(segment)
+                        if child is None:
+                            child = node.literals[segment] = _Node()
+                            self.node_count += 1
+                    elif segment in node.keyed:
+                        child = node.keyed[segment][1]
+                    else:
+                        if segment not in patterns:
+                            patterns[segment] = _segment_pattern(segment)
+                        child = _Node()
+                        self.node_count += 1
+                        node.keyed[segment] = (patterns[segment], child)
+                    node = child
+                node.templates.add(name)
+        # Deepest roots first, for roots nested in others.
+        self._root_paths = sorted(self._roots, key=lambda r: -len(r))
+
+    def _walk(self, nodes, segments):
+        for segment in segments:
+            next_nodes = []
+            for node in nodes:
+                child = node.literals.get(segment)
+                if child is not None:
+                    next_nodes.append(child)
+                for (pattern, child) in node.keyed.itervalues():
+                    if pattern.match(segment):
+                        next_nodes.append(child)
+            if not next_nodes:
+                return []
+            nodes = next_nodes
+        return nodes
+
+    def candidates(self, path):
+        """
+        Find the templates with the layout of a path, which the path may
+        match.
+
+        :param path: Absolute path
+        :returns list: Names of the candidate templates, sorted
+        """
+        path = _normpath(path)
+        found = set()
+        for root in self._root_paths:
+            if not path.startswith(root + "/"):
+                continue
+            (folder, name) = path[len(root) + 1:].rpartition("/")[::2]
+            # Files are mostly looked up by the folder, like the frames of a
+            # render, so the nodes of a folder are kept for the next file.
+            nodes = self._folders.get((root, folder))
+            if nodes is None:
+                nodes = self._walk([self._roots[root]], [s for s in folder.split("/") if s])
+                if len(self._folders) >= FOLDER_CACHE_SIZE:
+                    self._folders.clear()
+                self._folders[(root, folder)] = nodes
+            for node in self._walk(nodes, [name]):
+                found.update(node.templates)
+        return sorted(found)
+
+    def match(self, path):
+        """
+        Find the templates a path matches.
+
+        :param path: Absolute path
+        :returns list: (template name, dictionary of the fields) for each
+                       template matching, sorted by name
+        """
+        matches = []
+        for name in self.candidates(path):
+            template = self.templates[name]
+            if template.validate(path):
+                matches.append((name, template.get_fields(path)))
+        return matches
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog PATH [PATH ...]")
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("Expected at least one path")
+
+    tk = sgtk.sgtk_from_path(PIPELINE_CONFIG_ROOT)
+    index = TemplateIndex(tk.templates)
+    for path in args:
+        matches = index.match(os.path.abspath(path))
+        if not matches:
+            print("%s: no template" % path)
+        for (name, fields) in matches:
+            print("%s: %s %s" % (path, name, ", ".join("%s=%s" % i for i in sorted(fields.items()))))
+
+
+if __name__ == "__main__":
+    main()
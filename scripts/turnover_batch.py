@@ -0,0 +1,154 @@
+# Copyright (c) 2016 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Headless batch entry point for the plate and bid turnover reports.
+
+Runs a turnover report configured for the tk-shotgun-reportlab app in the
+shotgun_shot environment for a list of Shot ids, or for the Shots matching a
+saved query, without the Qt progress dialog. The Shots can be split across
+several machines with --shard, each of which writes its reports and a
+manifest of what it built to the output directory.
+
+Usage:
+
+    python turnover_batch.py --project-id 123 --report plate \\
+        (--ids 1,2,3 | --ids-file ids.txt | --filters '[["sg_status_list", "is", "ip"]]') \\
+        --output-dir /path/to/turnovers [--shard 1/4] [--force] \\
+        [--script-name NAME --script-key KEY]
+"""
+
+import json
+import optparse
+import os
+import socket
+import time
+from datetime import datetime
+
+# batch_common puts the core this configuration is installed with on the path.
+from batch_common import PIPELINE_CONFIG_ROOT, add_shot_options, authenticate, find_shot_ids
+import sgtk
+
+
+def parse_shard(shard):
+    """
+    Parse a shard specification.
+
+    :param shard: Shard as 'i/n', where i is from 1 to n
+    :returns tuple: The (i, n) ints
+    """
+    try:
+        (index, count) = [int(part) for part in shard.split("/")]
+    except ValueError:
+        raise ValueError("Invalid shard '%s', expected 'i/n'" % shard)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Invalid shard '%s', i must be from 1 to n" % shard)
+    return (index, count)
+
+
+def shard_ids(ids, index, count):
+    """
+    Pick the ids for one shard. The ids are sorted first so every machine
+    running the same query picks a distinct, evenly sized set of ids.
+
+    :param ids: All the Shot ids to run the report for
+    :param index: Shard number, from 1 to count
+    :param count: Number of shards
+    :returns list: The Shot ids for the shard
+    """
+    return sorted(set(ids))[index - 1::count]
+
+
+def run_report(tk, project_id, report, shot_ids, output_dir, force):
+    """
+    Run the turnover report for the Shot ids.
+
+    :param tk: Toolkit API instance for this configuration
+    :param project_id: Id of the Project the Shots belong to
+    :param report: Type of turnover report, ie. 'plate' or 'bid'
+    :param shot_ids: Shot ids to build reports for
+    :param output_dir: Directory to write the reports to
+    :param force: True to rebuild reports even if their data hasn't changed
+    :returns: List or path to .zip archive of the created PDF files
+    """
+    context = tk.context_from_entity("Project", project_id)
+    engine = sgtk.platform.start_shotgun_engine(tk, "Shot", context)
+    try:
+        app = engine.apps["tk-shotgun-reportlab"]
+        short_name = "%s_turnover_report" % report
+        report_configs = [c for c in app.get_setting("report_hooks")
+                          if c.get("short_name") == short_name]
+        if not report_configs:
+            raise ValueError("No '%s' report is configured for tk-shotgun-reportlab" % short_name)
+        # Shards share the output directory, so their reports can't all be
+        # zipped into the same archive.
+        report_config = dict(report_configs[0], force=force, zip_all_files=False)
+        return app.execute_hook_expression(report_config["report_hook"], "execute",
+            app=app, thread=None, entity_type="Shot", entity_ids=shot_ids,
+            progress_ct=0, destination_dir=output_dir, report_hook_config=report_config)
+    finally:
+        engine.destroy()
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_shot_options(parser)
+    parser.add_option("--report", choices=["plate", "bid"], default="plate",
+                      help="Type of turnover report, plate or bid")
+    parser.add_option("--shard", default="1/1", help="Shard of the Shots to run, as 'i/n'")
+    parser.add_option("--output-dir", help="Directory to write the reports and manifest to")
+    parser.add_option("--force", action="store_true", default=False,
+                      help="Rebuild reports even if their data hasn't changed")
+    (options, args) = parser.parse_args()
+    if not options.project_id or not options.output_dir:
+        parser.error("--project-id and --output-dir are required")
+    if not (options.ids or options.ids_file or options.filters):
+        parser.error("One of --ids, --ids-file or --filters is required")
+    try:
+        (shard_index, shard_count) = parse_shard(options.shard)
+    except ValueError, e:
+        parser.error(str(e))
+
+    authenticate(options)
+    tk = sgtk.sgtk_from_path(PIPELINE_CONFIG_ROOT)
+    ids = shard_ids(find_shot_ids(tk, options.project_id, options),
+                    shard_index, shard_count)
+
+    if not os.path.isdir(options.output_dir):
+        os.makedirs(options.output_dir)
+    manifest = {
+        "report": options.report,
+        "project_id": options.project_id,
+        "shard": options.shard,
+        "host": socket.gethostname(),
+        "started": datetime.now().isoformat(),
+        "shot_ids": ids,
+    }
+    start_time = time.time()
+    try:
+        outputs = run_report(tk, options.project_id, options.report, ids,
+                             options.output_dir, options.force) if ids else []
+        manifest["outputs"] = outputs
+        manifest["status"] = "complete"
+    except Exception, e:
+        manifest["status"] = "failed"
+        manifest["error"] = str(e)
+        raise
+    finally:
+        manifest["finished"] = datetime.now().isoformat()
+        manifest["duration"] = time.time() - start_time
+        manifest_path = os.path.join(options.output_dir, "%s_turnover_shard_%d_of_%d.json" %
+                                     (options.report, shard_index, shard_count))
+        with open(manifest_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()